@@ -0,0 +1,130 @@
+from ChessBitboard import (squareIndex, squareBits, iterateSquares, knightMasks, kingMasks, pawnAttackMasks,
+                           bishopRays, rookRays, rays)
+
+#Piece type and color values, as in ChessPieceType and ChessPieceColor
+PAWN, KNIGHT, BISHOP, ROOK, QUEEN, KING = range(0,6)
+WHITE, BLACK = range(0,2)
+
+
+#Squares attacked along the rays of a square, each ray stops at (and includes) its
+#first occupied square
+def rayAttacks(squareRays, occupied):
+    attacks = 0
+    for ray in squareRays:
+        for target in ray:
+            attacks |= squareBits[target]
+            if(occupied & squareBits[target]):
+                break
+    return attacks
+
+
+#Attack information of one position, computed once from the pieces and shared by legal
+#move filtering, move disambiguation and Chessgraph. For each color value it holds the
+#squares attacked by that side, the squares its king cannot go to, the pieces giving check
+#to its king, the squares that stop a single check and its pinned pieces with the squares
+#each pinned piece can still move to (the pin ray up to and including the pinner)
+class AttackMap:
+
+    def __init__(self, pieces, zobristHash = None):
+        #Hash of the position the map was computed for, see Chessboard.getAttackMap
+        self.zobristHash = zobristHash
+        self.pieceBitboards = [[0]*6, [0]*6]
+        self.colorBitboards = [0, 0]
+        for piece in pieces:
+            bit = squareBits[squareIndex(piece.file, piece.rank)]
+            self.pieceBitboards[piece.pieceColor.value][piece.pieceType.value] |= bit
+            self.colorBitboards[piece.pieceColor.value] |= bit
+        self.occupied = self.colorBitboards[WHITE] | self.colorBitboards[BLACK]
+
+        #Attacks of every piece by square
+        self.pieceAttacks = {}
+        self.attacks = [self.computeAttacks(color, self.occupied, self.pieceAttacks) for color in range(0,2)]
+        #Sliding pieces see through the king they attack, it cannot step back along the ray
+        self.kingDangerSquares = [self.computeAttacks(1 - color, self.occupied & ~self.pieceBitboards[color][KING], None) for color in range(0,2)]
+        self.checkers = [0, 0]
+        self.checkBlockSquares = [0, 0]
+        self.pinned = [0, 0]
+        self.pinRays = {}
+        for color in range(0,2):
+            self.computeChecksAndPins(color)
+
+    def computeAttacks(self, color, occupied, pieceAttacks):
+        attacks = 0
+        bitboards = self.pieceBitboards[color]
+        for pieceType in range(0,6):
+            for square in iterateSquares(bitboards[pieceType]):
+                if(pieceType == PAWN):
+                    squareAttacks = pawnAttackMasks[color][square]
+                elif(pieceType == KNIGHT):
+                    squareAttacks = knightMasks[square]
+                elif(pieceType == KING):
+                    squareAttacks = kingMasks[square]
+                elif(pieceType == BISHOP):
+                    squareAttacks = rayAttacks(bishopRays[square], occupied)
+                elif(pieceType == ROOK):
+                    squareAttacks = rayAttacks(rookRays[square], occupied)
+                else:
+                    squareAttacks = rayAttacks(rays[square], occupied)
+                if(pieceAttacks is not None):
+                    pieceAttacks[square] = squareAttacks
+                attacks |= squareAttacks
+        return attacks
+
+    def computeChecksAndPins(self, color):
+        kings = self.pieceBitboards[color][KING]
+        if(kings == 0):
+            return
+        kingSquare = (kings & -kings).bit_length() - 1
+        enemy = 1 - color
+        enemyBitboards = self.pieceBitboards[enemy]
+        own = self.colorBitboards[color]
+        self.checkers[color] = (knightMasks[kingSquare] & enemyBitboards[KNIGHT]) | (pawnAttackMasks[color][kingSquare] & enemyBitboards[PAWN])
+
+        #rays holds the four diagonal rays first and then the four straight ones
+        for rayIndex in range(0,8):
+            sliders = enemyBitboards[QUEEN] | (enemyBitboards[BISHOP] if rayIndex < 4 else enemyBitboards[ROOK])
+            raySquares = 0
+            ownPiece = None
+            for target in rays[kingSquare][rayIndex]:
+                bit = squareBits[target]
+                raySquares |= bit
+                if(not self.occupied & bit):
+                    continue
+                if(own & bit):
+                    if(ownPiece is not None):
+                        break
+                    ownPiece = target
+                    continue
+                if(sliders & bit):
+                    if(ownPiece is None):
+                        self.checkers[color] |= bit
+                        self.checkBlockSquares[color] |= raySquares & ~bit
+                    else:
+                        self.pinned[color] |= squareBits[ownPiece]
+                        self.pinRays[ownPiece] = raySquares
+                break
+
+    def isAttacked(self, square, byColor):
+        return bool(self.attacks[byColor] & squareBits[square])
+
+    def isInCheck(self, color):
+        return self.checkers[color] != 0
+
+    #Squares a piece of the given type and color on square can legally go to, the moves
+    #themselves still come from ChessPiece.availableMoves
+    def getLegalTargets(self, pieceType, color, square):
+        if(pieceType == KING):
+            return ~self.kingDangerSquares[color] & ((1 << 64) - 1)
+        checkers = self.checkers[color]
+        if(checkers & (checkers - 1)):
+            #Only the king can answer a double check
+            return 0
+        targets = (1 << 64) - 1
+        if(checkers):
+            targets = checkers | self.checkBlockSquares[color]
+        if(self.pinned[color] & squareBits[square]):
+            targets &= self.pinRays[square]
+        return targets
+
+    def isLegalMove(self, pieceType, color, fromSquare, toSquare):
+        return bool(self.getLegalTargets(pieceType, color, fromSquare) & squareBits[toSquare])
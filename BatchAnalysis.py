@@ -0,0 +1,119 @@
+import os
+import functools
+import collections
+import multiprocessing
+import Instrumentation
+from ChessGame import Chessboard
+from ChessGame import ChessPieceColor
+from ChessGame import ChessboardBackend
+from ChessGraph import Chessgraph
+from PositionCache import PositionCache
+from PositionCache import positionConnectivity
+from PGNReader import PGNGame
+from PGNReader import iterateGameTexts
+
+
+#Replays a game and returns the mean degree of the white and black graphs after every
+#move, the same loop as in PGNReader_tests. A game is anything with moves and
+#specialMoveValues (PGNReader, PGNGame) or a (moves, specialMoveValues) tuple. With a
+#PositionCache the moves and degrees of positions already seen are taken from it
+def analyzeGame(game, boardBackend = ChessboardBackend.NUMPY, positionCache = None):
+    moves, specialMoveValues = gameMoves(game)
+    board = Chessboard(boardBackend, verbose = False, positionCache = positionCache)
+    whiteAverageDegrees = []
+    blackAverageDegrees = []
+    for i in range(0,len(moves)):
+        board.makeMove(moves[i], specialMoveValues[i])
+        if(positionCache is not None):
+            whiteAverageDegrees.append(positionConnectivity(board, ChessPieceColor.WHITE, positionCache)[1])
+            blackAverageDegrees.append(positionConnectivity(board, ChessPieceColor.BLACK, positionCache)[1])
+            continue
+        whiteGraph = Chessgraph()
+        blackGraph = Chessgraph()
+        whiteGraph.initializeFromChessboardColored(board, ChessPieceColor.WHITE)
+        whiteAverageDegrees.append(whiteGraph.getMeanDegree())
+        blackGraph.initializeFromChessboardColored(board, ChessPieceColor.BLACK)
+        blackAverageDegrees.append(blackGraph.getMeanDegree())
+    return whiteAverageDegrees, blackAverageDegrees
+
+#Every worker process keeps its own cache between the games it analyzes
+workerPositionCaches = {}
+
+def getWorkerPositionCache(cacheCapacity):
+    if(cacheCapacity is None):
+        return None
+    if(not cacheCapacity in workerPositionCaches):
+        workerPositionCaches[cacheCapacity] = PositionCache(cacheCapacity)
+    return workerPositionCaches[cacheCapacity]
+
+def analyzeGameInWorker(game, boardBackend = ChessboardBackend.NUMPY, cacheCapacity = None):
+    return analyzeGame(game, boardBackend, getWorkerPositionCache(cacheCapacity))
+
+def gameMoves(game):
+    if(isinstance(game, tuple)):
+        return game
+    return game.moves, game.specialMoveValues
+
+#Parses a (headers, movetext) pair in the worker and analyzes it, games that cannot be
+#replayed give None
+def analyzeGameText(gameText, boardBackend = ChessboardBackend.NUMPY, cacheCapacity = None):
+    game = PGNGame(gameText[0], gameText[1])
+    try:
+        game.parseMoves(boardBackend)
+    except ValueError:
+        return None
+    return analyzeGameInWorker(game, boardBackend, cacheCapacity)
+
+def applyToChunk(function, chunk):
+    return [function(item) for item in chunk]
+
+#Yields function of every item, computed in a pool of workers processes when workers is not
+#1. Results come back in the order of items whatever the number of workers and the chunk
+#size. items is read chunkSize items at a time and at most maxPendingChunks chunks (two per
+#worker by default) are sent to the pool before their results are taken, so a generator of
+#items is streamed through the pool instead of being read whole
+def mapInPool(function, items, workers, chunkSize, maxPendingChunks = None):
+    if(workers == 1):
+        for item in items:
+            yield function(item)
+        return
+    if(maxPendingChunks is None):
+        maxPendingChunks = 2*(workers if workers is not None else os.cpu_count())
+    with multiprocessing.Pool(workers) as pool:
+        pending = collections.deque()
+        chunk = []
+        for item in items:
+            chunk.append(item)
+            if(len(chunk) == chunkSize):
+                pending.append(pool.apply_async(applyToChunk, (function, chunk)))
+                chunk = []
+                if(len(pending) >= maxPendingChunks):
+                    yield from pending.popleft().get()
+        if(len(chunk) > 0):
+            pending.append(pool.apply_async(applyToChunk, (function, chunk)))
+        while(len(pending) > 0):
+            yield from pending.popleft().get()
+
+#Analyzes a collection of games in a process pool and returns the (white, black) mean
+#degree series of every game, in the order of games. workers = None uses every core.
+#cacheCapacity gives every worker a PositionCache of that many positions
+def analyzeGames(games, workers = None, chunkSize = 1, boardBackend = ChessboardBackend.NUMPY, cacheCapacity = None):
+    #Only the moves are sent to the workers
+    gameMoveLists = [gameMoves(game) for game in games]
+    return list(mapInPool(functools.partial(analyzeGameInWorker, boardBackend = boardBackend, cacheCapacity = cacheCapacity), gameMoveLists, workers, chunkSize))
+
+#Same as analyzeGames with the instrumentation enabled in every worker, returns the results
+#and the merged Instrumentation snapshot of all the games
+def analyzeGamesInstrumented(games, workers = None, chunkSize = 1, boardBackend = ChessboardBackend.NUMPY, cacheCapacity = None):
+    gameMoveLists = [gameMoves(game) for game in games]
+    analyze = functools.partial(analyzeGameInWorker, boardBackend = boardBackend, cacheCapacity = cacheCapacity)
+    instrumentedResults = list(mapInPool(functools.partial(Instrumentation.instrumentedCall, analyze), gameMoveLists, workers, chunkSize))
+    results = [result for result, snapshot in instrumentedResults]
+    return results, Instrumentation.mergeSnapshots([snapshot for result, snapshot in instrumentedResults])
+
+#Same as analyzeGames for every game of a PGN file, the movetext is parsed in the workers
+#too. The results are yielded as they come, in the order of the games, and the file is read
+#as the pool needs more games. Games that cannot be replayed give None
+def analyzePGNFile(pgnPath, workers = None, chunkSize = 8, boardBackend = ChessboardBackend.NUMPY, cacheCapacity = None):
+    with open(pgnPath, "r") as pgnFile:
+        yield from mapInPool(functools.partial(analyzeGameText, boardBackend = boardBackend, cacheCapacity = cacheCapacity), iterateGameTexts(pgnFile), workers, chunkSize)
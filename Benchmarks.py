@@ -0,0 +1,443 @@
+import io
+import os
+import sys
+import json
+import random
+import time
+import argparse
+import contextlib
+import tracemalloc
+import matplotlib
+matplotlib.use("Agg")
+import matplotlib.pyplot as plt
+from ChessGame import Chessboard
+from ChessGame import ChessMove
+from ChessGame import ChessPieceType
+from ChessGame import ChessPieceColor
+from ChessGame import ChessboardBackend
+from ChessGame import initialFEN
+from ChessGraph import Chessgraph
+from ChessGraph import ChessgraphBackend
+from ChessGraph import ChessgraphRendering
+from GraphRenderer import ChessgraphRenderer
+from GameConnectivity import GameConnectivity
+from GameAnimation import GameAnimation
+from PGNReader import PGNReader
+from PGNReader import iterateGames
+from PGNReader import iterateGameTexts
+from PGNReader import parseMovetext
+
+repositoryDirectory = os.path.dirname(os.path.abspath(__file__))
+sampleGames = [os.path.join(repositoryDirectory, "juego_muestra.pgn"), os.path.join(repositoryDirectory, "juego_muestra_2.pgn")]
+#Multi game PGN built from the sample games by writeSyntheticPGN
+syntheticGames = os.path.join(repositoryDirectory, "juegos_sinteticos.pgn")
+#Suite results of the reference machine, written by --save-baseline. Timings depend on the
+#machine so the file is not versioned
+baselinePath = os.path.join(repositoryDirectory, "benchmark_baseline.json")
+
+#Positions of the perft counts: name, FEN, depth and expected number of leaves. The initial
+#position count is the standard one, the middlegame one comes from the sample game after 24
+#plies. Castling, en passant and promotions are not generated by ChessPiece, so deeper
+#counts differ from the standard perft tables
+perftPositions = [("initial", initialFEN, 3, 8902),
+                  ("sample middlegame", "r2q1rk1/1pp2ppp/1bn1pn2/1B1p1b2/3P1B2/2P1PN2/P4PPP/RN1Q1RK1 w - - 1 12", 2, None)]
+
+
+#Boards to benchmark: the initial position and the positions reached every
+#ten plies in the sample games
+def benchmarkPositions(plyStep = 10):
+    positions = []
+    with contextlib.redirect_stdout(io.StringIO()):
+        positions.append(("initial", Chessboard()))
+        for gameURL in sampleGames:
+            reader = PGNReader(gameURL)
+            for plies in range(plyStep, len(reader.moves) + 1, plyStep):
+                board = Chessboard()
+                for i in range(0,plies):
+                    board.makeMove(reader.moves[i], reader.specialMoveValues[i])
+                positions.append((os.path.basename(gameURL) + " ply " + str(plies), board))
+    return positions
+
+def movesSignature(pieces):
+    signature = []
+    for piece in pieces:
+        signature.append([(move.fromPosition[0], move.fromPosition[1], move.toPosition[0], move.toPosition[1], bool(move.take)) for move in piece.availableMoves])
+    return signature
+
+def timeCall(function, repetitions):
+    start = time.perf_counter()
+    for i in range(0,repetitions):
+        function()
+    return (time.perf_counter() - start)/repetitions
+
+#Generates the moves of every piece of each position with the reference routine
+#and with the move tables, checks that both give the same moves and reports the speedup
+def benchmarkMoveGeneration(repetitions = 200):
+    results = []
+    for label, board in benchmarkPositions():
+        def referenceGeneration():
+            for piece in board.pieces:
+                if(piece.pieceColor == ChessPieceColor.WHITE):
+                    piece.computeNewMovesReference(board.occupiedPositions, board.blackPiecesPositions)
+                else:
+                    piece.computeNewMovesReference(board.occupiedPositions, board.whitePiecesPositions)
+
+        referenceGeneration()
+        referenceMoves = movesSignature(board.pieces)
+        board.recomputeAvailableMoves()
+        if(movesSignature(board.pieces) != referenceMoves):
+            raise AssertionError("Move tables and reference generation differ at " + label)
+
+        referenceTime = timeCall(referenceGeneration, repetitions)
+        tableTime = timeCall(board.recomputeAvailableMoves, repetitions)
+        results.append((label, referenceTime, tableTime))
+
+    print("Position".ljust(32) + "Reference (us)".rjust(16) + "Tables (us)".rjust(16) + "Speedup".rjust(10))
+    for label, referenceTime, tableTime in results:
+        print(label.ljust(32) + ("%.1f" % (referenceTime*1e6)).rjust(16) + ("%.1f" % (tableTime*1e6)).rjust(16) + ("%.1fx" % (referenceTime/tableTime)).rjust(10))
+    return results
+
+#Replays the sample games with every backend, with full and with incremental move updates
+def benchmarkReplay(repetitions = 20):
+    with contextlib.redirect_stdout(io.StringIO()):
+        games = [PGNReader(gameURL) for gameURL in sampleGames]
+    results = []
+    for backend in ChessboardBackend:
+        for incrementalUpdates in [False, True]:
+            def replay():
+                with contextlib.redirect_stdout(io.StringIO()):
+                    for reader in games:
+                        board = Chessboard(backend, incrementalUpdates)
+                        for i in range(0,len(reader.moves)):
+                            board.makeMove(reader.moves[i], reader.specialMoveValues[i])
+            label = backend.name + (" incremental" if incrementalUpdates else " full")
+            results.append((label, timeCall(replay, repetitions)))
+
+    print("Replay".ljust(32) + "Time (ms)".rjust(16))
+    for label, replayTime in results:
+        print(label.ljust(32) + ("%.2f" % (replayTime*1e3)).rjust(16))
+    return results
+
+
+#(move, special move flag) of the legal moves of the side to move. The moves of every piece
+#are asked for when the previous ones were taken back, so moves can be made in between
+def iterateLegalMoves(board):
+    color = board.sideToMove
+    enemyColor = ChessPieceColor.BLACK if color == ChessPieceColor.WHITE else ChessPieceColor.WHITE
+    for piece in list(board.pieces):
+        if(piece.pieceColor != color):
+            continue
+        for move in board.getLegalMoves(piece):
+            specialMove = False
+            if(piece.pieceType == ChessPieceType.KING and board.findColorPieceIndexAtPosition(move.toPosition[0], move.toPosition[1], enemyColor) != -1):
+                #King moves are never generated as takes, the capture is made as a special move
+                move = ChessMove(move.fromPosition, move.toPosition, True)
+                specialMove = True
+            yield move, specialMove
+
+#Number of leaves of the tree of legal moves of the given depth, walked with makeMove and
+#unmakeMove
+def perft(board, depth):
+    if(depth == 0):
+        return 1
+    nodes = 0
+    for move, specialMove in iterateLegalMoves(board):
+        board.makeMove(move, specialMove)
+        nodes += perft(board, depth - 1)
+        board.unmakeMove()
+    return nodes
+
+#Everything makeMove changes: FEN, hash, the pieces with their moves, the occupancy matrices,
+#the bitboards and the taken pieces
+def boardState(board):
+    pieces = [(id(piece), piece.pieceType, piece.pieceColor, piece.file, piece.rank, piece.moveCount, piece.targets, piece.sight) for piece in board.pieces]
+    occupancy = (board.occupiedPositions.tolist(), board.whitePiecesPositions.tolist(), board.blackPiecesPositions.tolist())
+    bitboards = None
+    if(board.bitboards is not None):
+        bitboards = ([list(pieceBitboards) for pieceBitboards in board.bitboards.pieceBitboards], list(board.bitboards.colorBitboards),
+                     board.bitboards.occupied, [id(piece) for piece in board.bitboards.squarePieces])
+    return (board.getFEN(), board.positionKey(), board.moveCount, pieces, movesSignature(board.pieces), occupancy, bitboards, [id(piece) for piece in board.taken])
+
+#Makes the moves one by one and takes them all back, the state before every move must come
+#back exactly
+def checkUnmakeMoves(board, moves, specialMoveValues, label):
+    states = []
+    for i in range(0,len(moves)):
+        states.append(boardState(board))
+        if(not board.makeMove(moves[i], specialMoveValues[i])):
+            raise AssertionError("Move " + str(i) + " of " + label + " was refused")
+    for i in range(len(moves) - 1, -1, -1):
+        board.unmakeMove()
+        if(boardState(board) != states[i]):
+            raise AssertionError("unmakeMove of move " + str(i) + " of " + label + " does not restore the position " + states[i][0])
+
+#make/unmake round trips on random legal games (seeded) and on the movetext cases, for every
+#backend with full and incremental move updates
+def checkMakeUnmake(nGames = 20, plies = 60, seed = 1):
+    generator = random.Random(seed)
+    for backend in ChessboardBackend:
+        for incrementalUpdates in [False, True]:
+            label = backend.name + (" incremental" if incrementalUpdates else " full")
+            for gameNumber in range(0,nGames):
+                board = Chessboard(backend, incrementalUpdates, verbose = False)
+                moves = []
+                specialMoveValues = []
+                for ply in range(0,plies):
+                    legalMoves = list(iterateLegalMoves(board))
+                    if(len(legalMoves) == 0):
+                        break
+                    move, specialMove = generator.choice(legalMoves)
+                    board.makeMove(move, specialMove)
+                    moves.append(move)
+                    specialMoveValues.append(specialMove)
+                checkUnmakeMoves(Chessboard(backend, incrementalUpdates, verbose = False), moves, specialMoveValues, "random game " + str(gameNumber) + " " + label)
+            for name, movetext, expectedFEN in movetextCases:
+                moves, specialMoveValues, sanMoves = parseMovetext(movetext, Chessboard(backend, verbose = False))
+                checkUnmakeMoves(Chessboard(backend, incrementalUpdates, verbose = False), moves, specialMoveValues, name + " " + label)
+    print("make/unmake: " + str(nGames) + " random games and " + str(len(movetextCases)) + " movetexts per backend OK")
+
+#Movetexts and the FEN of the position after them, with comments, NAGs, nested variations,
+#castlings written with zeros, annotation marks, promotions, king captures and en passant
+movetextCases = [("comments, NAGs and variations", "1.e4 {Best by test} e5 $1 2.Nf3 (2.f4 exf4 3.Nf3 (3.Bc4)) Nc6 3.Bc4 ; Italian\nBc5 4.0-0 Nf6! 5.d3 O-O *",
+                  "r1bq1rk1/pppp1ppp/2n2n2/2b1p3/2B1P3/3P1N2/PPP2PPP/RNBQ1RK1 w - - 1 6"),
+                 ("long castlings", "1.d4 d5 2.Nc3 Nc6 3.Bf4 Bf5 4.Qd2 Qd7 5.O-O-O O-O-O?! 6.Kb1 *",
+                  "2kr1bnr/pppqpppp/2n5/3p1b2/3P1B2/2N5/PPPQPPPP/1K1R1BNR b - - 9 6"),
+                 ("promotion", "1.h4 g5 2.hxg5 Nh6 3.gxh6 Bg7 4.hxg7 Rf8 5.gxf8=Q+ Kxf8 6.Rxh7 *",
+                  "rnbq1k2/pppppp1R/8/8/8/8/PPPPPPP1/RNBQKBN1 b Q - 0 6"),
+                 ("king capture", "1.f4 e5 2.Kf2 Qh4+ 3.g3 Qxg3+ 4.Kxg3 Nc6 5.a3 *",
+                  "r1b1kbnr/pppp1ppp/2n5/4p3/5P2/P5K1/1PPPP2P/RNBQ1BNR b kq - 0 5"),
+                 ("en passant", "1.e4 a6 2.e5 d5 3.exd6 e5 4.d4 e4 5.f4 exf3 6.Nxf3 *",
+                  "rnbqkbnr/1pp2ppp/p2P4/8/3P4/5N2/PPP3PP/RNBQKB1R b KQkq - 0 6")]
+
+#Replays every movetext case with parseMovetext on each backend and compares the FEN of the
+#board and of a board replaying the returned moves with the expected one
+def checkMovetextParsing():
+    for name, movetext, expectedFEN in movetextCases:
+        for backend in ChessboardBackend:
+            board = Chessboard(backend, verbose = False)
+            moves, specialMoveValues, sanMoves = parseMovetext(movetext, board)
+            if(board.getFEN() != expectedFEN):
+                raise AssertionError("parseMovetext of " + name + " on " + backend.name + " gives " + board.getFEN() + " instead of " + expectedFEN)
+            replayBoard = Chessboard(backend, verbose = False)
+            for i in range(0,len(moves)):
+                replayBoard.makeMove(moves[i], specialMoveValues[i])
+            if(replayBoard.getFEN() != expectedFEN):
+                raise AssertionError("Replay of the moves of " + name + " on " + backend.name + " gives " + replayBoard.getFEN())
+    print("Movetext parsing: " + str(len(movetextCases)) + " cases OK")
+
+#FENs that must come back unchanged from loadFEN and getFEN: partial castling rights, en
+#passant squares and halfmove and fullmove counters
+fenRoundTripCases = [initialFEN,
+                     "rnbqkbnr/pp2pppp/8/2ppP3/8/8/PPPP1PPP/RNBQKBNR w KQkq d6 0 3",
+                     "rnbqkbnr/ppp1pppp/8/8/3pP3/5N2/PPPP1PPP/RNBQKB1R b KQkq e3 0 3",
+                     "r3k2r/8/8/8/8/8/8/R3K2R b Kq - 12 40",
+                     "4k2r/8/8/8/8/8/6p1/4K2R b Kk - 7 61",
+                     "8/8/8/4k3/8/8/8/4K3 w - - 99 120"]
+#Positions loaded from a FEN, a movetext played from them and the FEN after it
+fenReplayCases = [("rnbqkbnr/pp2pppp/8/2ppP3/8/8/PPPP1PPP/RNBQKBNR w KQkq d6 0 3", "3.exd6 *",
+                   "rnbqkbnr/pp2pppp/3P4/2p5/8/8/PPPP1PPP/RNBQKBNR b KQkq - 0 3"),
+                  ("r3k2r/pppq1ppp/2npbn2/4p3/4P3/2NPBN2/PPPQ1PPP/R3K2R w KQkq - 4 8", "8.O-O-O O-O *",
+                   "r4rk1/pppq1ppp/2npbn2/4p3/4P3/2NPBN2/PPPQ1PPP/2KR3R w - - 6 9"),
+                  ("4k2r/6P1/8/8/8/8/8/4K3 w k - 0 50", "50.gxh8=Q+ *",
+                   "4k2Q/8/8/8/8/8/8/4K3 b - - 0 50")]
+
+#Moves of every square, loadFEN lists the pieces in its own order
+def movesBySquare(board):
+    return {(piece.file, piece.rank): movesSignature([piece])[0] for piece in board.pieces}
+
+#FEN round trips on every backend, movetexts played from loaded positions, and the FEN of
+#every ply of the movetext cases loaded again: same FEN, position key and moves
+def checkFEN():
+    for backend in ChessboardBackend:
+        for fen in fenRoundTripCases:
+            board = Chessboard(backend, verbose = False, fen = fen)
+            if(board.getFEN() != fen):
+                raise AssertionError("FEN round trip on " + backend.name + " gives " + board.getFEN() + " instead of " + fen)
+        for fen, movetext, expectedFEN in fenReplayCases:
+            board = Chessboard(backend, verbose = False, fen = fen)
+            parseMovetext(movetext, board)
+            if(board.getFEN() != expectedFEN):
+                raise AssertionError(movetext + " from " + fen + " on " + backend.name + " gives " + board.getFEN() + " instead of " + expectedFEN)
+        for name, movetext, expectedFEN in movetextCases:
+            moves, specialMoveValues, sanMoves = parseMovetext(movetext, Chessboard(backend, verbose = False))
+            board = Chessboard(backend, verbose = False)
+            for i in range(0,len(moves)):
+                board.makeMove(moves[i], specialMoveValues[i])
+                loadedBoard = Chessboard(backend, verbose = False, fen = board.getFEN())
+                if(loadedBoard.getFEN() != board.getFEN() or loadedBoard.positionKey() != board.positionKey() or movesBySquare(loadedBoard) != movesBySquare(board)):
+                    raise AssertionError("Board loaded from " + board.getFEN() + " differs from the replay of " + name + " on " + backend.name)
+    print("FEN: " + str(len(fenRoundTripCases)) + " round trips and " + str(len(fenReplayCases)) + " replays per backend OK")
+
+#Writes a PGN file with nGames games, the moves of the sample games with changing headers
+def writeSyntheticPGN(path = syntheticGames, nGames = 200):
+    gameTexts = []
+    for gameURL in sampleGames:
+        with open(gameURL, "r") as pgnFile:
+            gameTexts.extend(iterateGameTexts(pgnFile))
+    with open(path, "w") as pgnFile:
+        for i in range(0,nGames):
+            headers, movetext = gameTexts[i % len(gameTexts)]
+            whitePlayer = "Player" + str(2*i)
+            blackPlayer = "Player" + str(2*i + 1)
+            winner = whitePlayer if headers.get("Result") == "1-0" else blackPlayer
+            values = [("Event", "Synthetic"), ("Site", "Benchmarks"), ("Date", "2023." + ("%02d" % (1 + i % 12)) + "." + ("%02d" % (1 + i % 28))),
+                      ("Round", str(i + 1)), ("White", whitePlayer), ("Black", blackPlayer), ("Result", headers.get("Result", "*")),
+                      ("ECO", headers.get("ECO", "A00")), ("WhiteElo", str(600 + (37*i) % 1800)), ("BlackElo", str(600 + (53*i) % 1800)),
+                      ("Termination", winner + " won by resignation")]
+            for name, value in values:
+                pgnFile.write("[" + name + " \"" + value + "\"]\n")
+            pgnFile.write("\n" + movetext + "\n\n")
+
+#Runs function once under tracemalloc and returns the peak of the allocated memory
+def peakMemory(function):
+    tracemalloc.start()
+    try:
+        function()
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+#Times function (repetitions calls of operations operations each, best of rounds) and
+#measures its peak memory in a separate call, the tracing would slow the timed calls down
+def measure(name, function, operations, repetitions = 1, rounds = 3):
+    function()
+    seconds = min([timeCall(function, repetitions) for i in range(0,rounds)])
+    return {"name": name, "operations": operations, "seconds": seconds, "opsPerSecond": operations/seconds, "peakMemory": peakMemory(function)}
+
+def benchmarkPerft(backend = ChessboardBackend.BITBOARD):
+    results = []
+    for name, fen, depth, expectedNodes in perftPositions:
+        nodes = perft(Chessboard(backend, True, verbose = False, fen = fen), depth)
+        if(expectedNodes is not None and nodes != expectedNodes):
+            raise AssertionError("perft(" + str(depth) + ") of " + name + " gives " + str(nodes) + " instead of " + str(expectedNodes))
+        result = measure("perft " + name + " depth " + str(depth), lambda: perft(Chessboard(backend, True, verbose = False, fen = fen), depth), nodes)
+        result["nodes"] = nodes
+        results.append(result)
+    return results
+
+#Games per second of the streaming reader on the synthetic PGN
+def benchmarkPGNIngestion(backend = ChessboardBackend.BITBOARD):
+    if(not os.path.exists(syntheticGames)):
+        writeSyntheticPGN()
+    nGames = len(list(iterateGames(syntheticGames, backend)))
+    return [measure("PGN ingestion " + backend.name, lambda: list(iterateGames(syntheticGames, backend)), nGames)]
+
+#Graph of each color and its mean degree after every ply of the sample games
+def benchmarkGraphBuilding():
+    games = [next(iterateGames(gameURL)) for gameURL in sampleGames]
+    boards = []
+    for game in games:
+        board = Chessboard(ChessboardBackend.BITBOARD, verbose = False)
+        for i in range(0,len(game.moves)):
+            board.makeMove(game.moves[i], game.specialMoveValues[i])
+            boards.append(Chessboard(ChessboardBackend.BITBOARD, verbose = False, fen = board.getFEN()))
+    results = []
+    for graphBackend in ChessgraphBackend:
+        def buildGraphs():
+            for board in boards:
+                for color in ChessPieceColor:
+                    graph = Chessgraph(graphBackend)
+                    graph.initializeFromChessboardColored(board, color)
+                    graph.getMeanDegree()
+        results.append(measure("graph per ply " + graphBackend.name, buildGraphs, len(boards), 5))
+    return results
+
+#Drawing of the board and of a graph, rendered on the Agg backend
+def benchmarkDisplay(repetitions = 5):
+    board = Chessboard(verbose = False)
+    graph = Chessgraph()
+    graph.initializeFromChessboardColored(board, ChessPieceColor.WHITE)
+    def drawBoard():
+        board.displayBoard()
+        plt.gcf().canvas.draw()
+        plt.close("all")
+    def drawGraph(rendering = ChessgraphRendering.LINES):
+        graph.displayGraph(rendering)
+        plt.gcf().canvas.draw()
+        plt.close("all")
+    game = next(iterateGames(sampleGames[0]))
+    def animateGame():
+        animation = GameAnimation.fromGame(game)
+        for frame in animation.iterateFrames():
+            pass
+    nFrames = len(list(GameAnimation.fromGame(game).iterateFrames()))
+    plt.close("all")
+    #White and black graphs of every ply side by side, rendered without writing the files
+    connectivity = GameConnectivity.fromGame(game)
+    renderer = ChessgraphRenderer(2)
+    def renderPlies():
+        for ply in range(0,connectivity.getNumberOfPlies()):
+            renderer.renderAdjacencies([connectivity.adjacency[ChessPieceColor.WHITE][ply], connectivity.adjacency[ChessPieceColor.BLACK][ply]])
+    return [measure("displayBoard", drawBoard, 1, repetitions), measure("displayGraph", drawGraph, 1, repetitions),
+            measure("displayGraph BATCHED", lambda: drawGraph(ChessgraphRendering.BATCHED), 1, repetitions),
+            measure("GameAnimation frames", animateGame, nFrames),
+            measure("ChessgraphRenderer plies", renderPlies, connectivity.getNumberOfPlies())]
+
+#Correctness checks, they raise an AssertionError on the first failure
+def runChecks():
+    checkMovetextParsing()
+    checkMakeUnmake()
+    checkFEN()
+
+def runBenchmarkSuite():
+    results = []
+    results.extend(benchmarkPerft())
+    results.extend(benchmarkPGNIngestion())
+    results.extend(benchmarkGraphBuilding())
+    results.extend(benchmarkDisplay())
+    return results
+
+def printResults(results):
+    print("Benchmark".ljust(40) + "Ops/s".rjust(14) + "Time (ms)".rjust(14) + "Peak (KiB)".rjust(14))
+    for result in results:
+        print(result["name"].ljust(40) + ("%.1f" % result["opsPerSecond"]).rjust(14) + ("%.2f" % (result["seconds"]*1e3)).rjust(14) + ("%.1f" % (result["peakMemory"]/1024)).rjust(14))
+
+def saveBaseline(results, path = baselinePath):
+    with open(path, "w") as baselineFile:
+        json.dump({result["name"]: result for result in results}, baselineFile, indent = 2)
+
+#Returns the results whose ops/s fell more than threshold (a fraction) below the baseline
+#or whose perft count changed, as (result, baseline result) pairs
+def findRegressions(results, path = baselinePath, threshold = 0.2):
+    with open(path, "r") as baselineFile:
+        baseline = json.load(baselineFile)
+    regressions = []
+    for result in results:
+        if(not result["name"] in baseline):
+            continue
+        baselineResult = baseline[result["name"]]
+        slower = result["opsPerSecond"] < (1 - threshold)*baselineResult["opsPerSecond"]
+        if(slower or result.get("nodes") != baselineResult.get("nodes")):
+            regressions.append((result, baselineResult))
+    return regressions
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description = "Benchmarks of move generation, PGN ingestion, graph building and drawing")
+    parser.add_argument("--check", action = "store_true", help = "only run the correctness checks")
+    parser.add_argument("--suite", action = "store_true", help = "run the benchmark suite instead of the move generation and replay comparisons")
+    parser.add_argument("--save-baseline", action = "store_true", help = "store the suite results as the baseline")
+    parser.add_argument("--baseline", default = baselinePath, help = "baseline JSON file")
+    parser.add_argument("--threshold", type = float, default = 0.2, help = "slowdown over the baseline flagged as a regression")
+    arguments = parser.parse_args()
+
+    if(arguments.check):
+        runChecks()
+        sys.exit(0)
+    if(not arguments.suite and not arguments.save_baseline):
+        runChecks()
+        benchmarkMoveGeneration()
+        benchmarkReplay()
+        sys.exit(0)
+
+    results = runBenchmarkSuite()
+    printResults(results)
+    if(arguments.save_baseline):
+        saveBaseline(results, arguments.baseline)
+    elif(os.path.exists(arguments.baseline)):
+        regressions = findRegressions(results, arguments.baseline, arguments.threshold)
+        for result, baselineResult in regressions:
+            print("REGRESSION " + result["name"] + ": " + ("%.1f" % result["opsPerSecond"]) + " ops/s, baseline " + ("%.1f" % baselineResult["opsPerSecond"]))
+        sys.exit(1 if len(regressions) > 0 else 0)
+    else:
+        print("No baseline at " + arguments.baseline + ", nothing is compared. Run with --save-baseline on the reference machine first")
@@ -0,0 +1,141 @@
+#Bitboard representation of a chess position. Every square is a bit of a
+#python integer, squares are numbered following the layout of the occupancy
+#matrices of Chessboard: square = 8*i + j where i = 8 - rank and j is the file
+#index, so A8 is square 0 and H1 is square 63.
+import random
+import numpy as np
+
+fileNotation = ["A", "B", "C", "D", "E", "F", "G", "H"]
+fileIndices = {fileNotation[j]: j for j in range(0,8)}
+
+squareFiles = [fileNotation[square % 8] for square in range(0,64)]
+squareRanks = [8 - square//8 for square in range(0,64)]
+squareBits = [1 << square for square in range(0,64)]
+
+#Move offsets in matrix coordinates (row, column), the order of the lists is the
+#order in which ChessPiece generates its moves
+knightOffsets = [(2,1), (2,-1), (-2,1), (-2,-1), (1,2), (-1,2), (1,-2), (-1,-2)]
+kingOffsets = [(i,j) for i in range(-1,2) for j in range(-1,2) if not (i == 0 and j == 0)]
+bishopDirections = [(-1,-1), (1,1), (1,-1), (-1,1)]
+rookDirections = [(-1,0), (1,0), (0,-1), (0,1)]
+queenDirections = bishopDirections + rookDirections
+
+
+def squareIndex(file, rank):
+    return 8*(8 - rank) + fileIndices[file]
+
+def squareName(square):
+    return squareFiles[square] + str(squareRanks[square])
+
+def iterateSquares(bitboard):
+    while(bitboard):
+        lowestBit = bitboard & -bitboard
+        yield lowestBit.bit_length() - 1
+        bitboard ^= lowestBit
+
+def countSquares(bitboard):
+    return bin(bitboard).count("1")
+
+def offsetTargets(offsets):
+    targets = []
+    for square in range(0,64):
+        i = square//8
+        j = square % 8
+        squareTargets = []
+        for offset in offsets:
+            if(0 <= i + offset[0] <= 7 and 0 <= j + offset[1] <= 7):
+                squareTargets.append(8*(i + offset[0]) + j + offset[1])
+        targets.append(squareTargets)
+    return targets
+
+def rayTargets(directions):
+    rays = []
+    for square in range(0,64):
+        i = square//8
+        j = square % 8
+        squareRays = []
+        for direction in directions:
+            ray = []
+            k = 1
+            while(0 <= i + k*direction[0] <= 7 and 0 <= j + k*direction[1] <= 7):
+                ray.append(8*(i + k*direction[0]) + j + k*direction[1])
+                k += 1
+            squareRays.append(ray)
+        rays.append(squareRays)
+    return rays
+
+def bitboardFromSquares(squares):
+    bitboard = 0
+    for square in squares:
+        bitboard |= squareBits[square]
+    return bitboard
+
+def bitboardFromArray(array):
+    bits = np.packbits(np.asarray(array).reshape(64) == 1, bitorder = "little")
+    return int.from_bytes(bits.tobytes(), "little")
+
+#Tables computed once per process
+knightTargets = offsetTargets(knightOffsets)
+kingTargets = offsetTargets(kingOffsets)
+knightMasks = [bitboardFromSquares(targets) for targets in knightTargets]
+kingMasks = [bitboardFromSquares(targets) for targets in kingTargets]
+#rays[square] holds the bishop rays first and then the rook rays, as the queen needs them
+rays = rayTargets(queenDirections)
+bishopRays = [squareRays[0:4] for squareRays in rays]
+rookRays = [squareRays[4:8] for squareRays in rays]
+
+#Pawn tables are indexed by ChessPieceColor.value, white pawns move up the board (row - 1)
+pawnPushTargets = [[], []]
+pawnDoublePushTargets = [[], []]
+pawnAttackTargets = [offsetTargets([(-1,-1), (-1,1)]), offsetTargets([(1,-1), (1,1)])]
+pawnAttackMasks = [[bitboardFromSquares(targets) for targets in pawnAttackTargets[color]] for color in range(0,2)]
+for color, step in [(0, -1), (1, 1)]:
+    for square in range(0,64):
+        i = square//8
+        pawnPushTargets[color].append(square + 8*step if 0 <= i + step <= 7 else None)
+        pawnDoublePushTargets[color].append(square + 16*step if 0 <= i + 2*step <= 7 else None)
+
+#Zobrist keys, zobristKeys[color][type][square] is the random 64 bit key of a piece of that
+#color and type on the square. The seed is fixed so hashes agree between processes and runs
+zobristRandom = random.Random(20240229)
+zobristKeys = [[[zobristRandom.getrandbits(64) for square in range(0,64)] for pieceType in range(0,6)] for color in range(0,2)]
+
+def zobristPieceKey(piece, square):
+    return zobristKeys[piece.pieceColor.value][piece.pieceType.value][square]
+
+
+class ChessBitboard:
+
+    def __init__(self):
+        #Indexed by ChessPieceColor.value and ChessPieceType.value
+        self.pieceBitboards = [[0]*6, [0]*6]
+        self.colorBitboards = [0, 0]
+        self.occupied = 0
+        self.squarePieces = [None]*64
+
+    def addPiece(self, piece, square):
+        bit = squareBits[square]
+        self.pieceBitboards[piece.pieceColor.value][piece.pieceType.value] |= bit
+        self.colorBitboards[piece.pieceColor.value] |= bit
+        self.occupied |= bit
+        self.squarePieces[square] = piece
+
+    def removePiece(self, piece, square):
+        mask = ~squareBits[square]
+        self.pieceBitboards[piece.pieceColor.value][piece.pieceType.value] &= mask
+        self.colorBitboards[piece.pieceColor.value] &= mask
+        self.occupied &= mask
+        self.squarePieces[square] = None
+
+    def movePiece(self, piece, fromSquare, toSquare):
+        self.removePiece(piece, fromSquare)
+        self.addPiece(piece, toSquare)
+
+    def pieceAt(self, square):
+        return self.squarePieces[square]
+
+    def toArray(self, bitboard):
+        array = np.zeros(64)
+        for square in iterateSquares(bitboard):
+            array[square] = 1
+        return array.reshape((8,8))
@@ -1,9 +1,14 @@
+import os
 import numpy as np
 import matplotlib.pyplot as plt
 from enum import Enum
 from PIL import Image
 from matplotlib.patches import Rectangle
 from matplotlib.offsetbox import (OffsetImage, AnnotationBbox)
+from AttackMap import AttackMap
+from ChessBitboard import (ChessBitboard, squareIndex, squareBits, squareFiles, squareRanks, iterateSquares, bitboardFromArray, zobristPieceKey,
+                           knightTargets, kingTargets, bishopRays, rookRays, rays,
+                           knightMasks, kingMasks, pawnAttackMasks, pawnPushTargets, pawnDoublePushTargets, pawnAttackTargets)
 
 
 class CoordinateTranslator:
@@ -36,41 +41,326 @@ class ChessPieceType(Enum):
 class ChessPieceColor(Enum):
     WHITE = 0
     BLACK = 1
+
+#Storage used by Chessboard for the position, NUMPY keeps the 8x8 occupancy
+#matrices only and BITBOARD also keeps one 64 bit integer per piece type and color
+class ChessboardBackend(Enum):
+    NUMPY = 0
+    BITBOARD = 1
     
 class ChessMove:
+    __slots__ = ("fromPosition", "toPosition", "take", "promotion")
     
-    def __init__(self, fromPosition, toPosition, take):
+    #promotion is the ChessPieceType a pawn becomes, it is not compared by __eq__ so
+    #promotions match the generated pawn moves
+    def __init__(self, fromPosition, toPosition, take, promotion = None):
         self.fromPosition = fromPosition
         self.toPosition = toPosition
         self.take = take
+        self.promotion = promotion
         
     def __eq__(self, other):
+        #Generated moves are shared objects, most comparisons end here
+        if(self is other):
+            return True
         equalFromPosition = (self.fromPosition[0] == other.fromPosition[0] and self.fromPosition[1] == other.fromPosition[1])
         equalToPosition = (self.toPosition[0] == other.toPosition[0] and self.toPosition[1] == other.toPosition[1])
         equalTake = (self.take == other.take)
         return equalFromPosition and equalToPosition and equalTake
+    
+    def __hash__(self):
+        return hash((self.fromPosition[0], self.fromPosition[1], self.toPosition[0], self.toPosition[1], bool(self.take)))
+    
+    def __repr__(self):
+        promotion = ", " + self.promotion.name if self.promotion is not None else ""
+        return "ChessMove(" + str(self.fromPosition) + ", " + str(self.toPosition) + ", " + str(bool(self.take)) + promotion + ")"
+
+
+#Moves packed in 16 bits: from square in bits 0-5, to square in bits 6-11 (squares as in
+#ChessBitboard), take flag in bit 12 and the kind of move in bits 13-15: 0 for a normal
+#move, 1 for a special move (castlings are never promotions) and 2 to 5 for a promotion
+#to the piece of packedPromotionTypes
+packedTakeFlag = 1 << 12
+packedSpecialMoveFlag = 1 << 13
+packedPromotionTypes = [ChessPieceType.KNIGHT, ChessPieceType.BISHOP, ChessPieceType.ROOK, ChessPieceType.QUEEN]
+
+def packMove(move, specialMove = False):
+    code = squareIndex(move.fromPosition[0], move.fromPosition[1]) | (squareIndex(move.toPosition[0], move.toPosition[1]) << 6)
+    if(move.take):
+        code |= packedTakeFlag
+    if(specialMove):
+        code |= packedSpecialMoveFlag
+    elif(move.promotion is not None):
+        code |= (2 + packedPromotionTypes.index(move.promotion)) << 13
+    return code
+
+def unpackPromotion(code):
+    moveKind = code >> 13
+    return packedPromotionTypes[moveKind - 2] if moveKind >= 2 else None
+
+#Returns the ChessMove and the special move flag of a packed move
+def unpackMove(code):
+    fromSquare = code & 63
+    toSquare = (code >> 6) & 63
+    move = ChessMove([squareFiles[fromSquare], squareRanks[fromSquare]], [squareFiles[toSquare], squareRanks[toSquare]], bool(code & packedTakeFlag), unpackPromotion(code))
+    return move, (code >> 13) == 1
+
+#Packs a game (moves and special move flags as PGNReader gives them) into a uint16 array
+def packMoveList(moves, specialMoveValues = None):
+    codes = np.zeros(len(moves), dtype = np.uint16)
+    for i in range(0,len(moves)):
+        codes[i] = packMove(moves[i], specialMoveValues is not None and specialMoveValues[i])
+    return codes
+
+#Number of moves from index i that make a single ply of a game. A castling is two special
+#moves, the king one never takes, and an en passant capture is two special moves of the
+#pawn: the capture beside it and the step forward. Other special moves, like king captures,
+#are one ply
+def getPlyLength(moves, specialMoveValues, i):
+    if(not specialMoveValues[i] or i + 1 >= len(moves) or not specialMoveValues[i + 1]):
+        return 1
+    if(not moves[i].take or moves[i + 1].fromPosition == moves[i].toPosition):
+        return 2
+    return 1
+
+def unpackMoveList(codes):
+    moves = []
+    specialMoveValues = []
+    for code in codes:
+        move, specialMove = unpackMove(int(code))
+        moves.append(move)
+        specialMoveValues.append(specialMove)
+    return moves, specialMoveValues
+
+
+#A packed move in an object, with O(1) equality and hashing
+class CompactMove:
+    __slots__ = ("code",)
+    
+    def __init__(self, code):
+        self.code = int(code)
+    
+    @classmethod
+    def fromChessMove(cls, move, specialMove = False):
+        return cls(packMove(move, specialMove))
+    
+    def toChessMove(self):
+        return unpackMove(self.code)[0]
+    
+    @property
+    def fromSquare(self):
+        return self.code & 63
+    
+    @property
+    def toSquare(self):
+        return (self.code >> 6) & 63
+    
+    @property
+    def take(self):
+        return bool(self.code & packedTakeFlag)
+    
+    @property
+    def specialMove(self):
+        return (self.code >> 13) == 1
+    
+    @property
+    def promotion(self):
+        return unpackPromotion(self.code)
+    
+    def __eq__(self, other):
+        return isinstance(other, CompactMove) and self.code == other.code
+    
+    def __hash__(self):
+        return self.code
+    
+    def __int__(self):
+        return self.code
+    
+    def __repr__(self):
+        move = self.toChessMove()
+        return "CompactMove(" + move.fromPosition[0] + str(move.fromPosition[1]) + move.toPosition[0] + str(move.toPosition[1]) + (", take" if self.take else "") + (", special" if self.specialMove else "") + (", " + self.promotion.name if self.promotion is not None else "") + ")"
         
 
+#Move tables built once per process. For every square they hold, in generation
+#order, tuples (target bit, quiet move, take move) with the ChessMove objects already
+#built, so generating the moves of a piece only appends shared objects
+def buildMoveList(square, squareTargets):
+    fromPosition = [squareFiles[square], squareRanks[square]]
+    moveList = []
+    for target in squareTargets:
+        if(target is None):
+            continue
+        toPosition = [squareFiles[target], squareRanks[target]]
+        moveList.append((squareBits[target], ChessMove(fromPosition, toPosition, False), ChessMove(fromPosition, toPosition, True)))
+    return moveList
+
+def buildMoveTable(targetTable):
+    return [buildMoveList(square, targetTable[square]) for square in range(0,64)]
+
+def buildRayMoveTable(rayTable):
+    return [[buildMoveList(square, ray) for ray in rayTable[square]] for square in range(0,64)]
+
+knightMoveTable = buildMoveTable(knightTargets)
+kingMoveTable = buildMoveTable(kingTargets)
+#Indexed by ChessPieceColor.value first
+pawnFirstMoveTable = [buildMoveTable([[pawnPushTargets[color][square], pawnDoublePushTargets[color][square]] for square in range(0,64)]) for color in range(0,2)]
+pawnPushMoveTable = [buildMoveTable([[pawnPushTargets[color][square]] for square in range(0,64)]) for color in range(0,2)]
+pawnAttackMoveTable = [buildMoveTable(pawnAttackTargets[color]) for color in range(0,2)]
+#Indexed by ChessPieceType.value, then square and ray
+slidingMoveTables = {ChessPieceType.BISHOP.value: buildRayMoveTable(bishopRays),
+                     ChessPieceType.ROOK.value: buildRayMoveTable(rookRays),
+                     ChessPieceType.QUEEN.value: buildRayMoveTable(rays)}
+
+#Piece types as integers, generatePieceMoves runs once per piece and move and comparing
+#plain integers avoids the Enum attribute lookups
+pawnType = ChessPieceType.PAWN.value
+knightType = ChessPieceType.KNIGHT.value
+kingType = ChessPieceType.KING.value
+
+#Moves, targets and sight of a piece of the type and color (ChessPieceType.value and
+#ChessPieceColor.value) on square, from the move tables and the occupancy bitboards
+def generatePieceMoves(pieceType, color, square, firstMove, occupied, enemy):
+    moves = []
+    targets = 0
+    
+    if(pieceType == pawnType):
+        sight = pawnAttackMasks[color][square]
+        if(firstMove):
+            #The first move of a pawn does not look at the occupancy
+            for bit, move, takeMove in pawnFirstMoveTable[color][square]:
+                moves.append(move)
+                targets |= bit
+        else:
+            for bit, move, takeMove in pawnPushMoveTable[color][square]:
+                sight |= bit
+                if(not occupied & bit):
+                    moves.append(move)
+                    targets |= bit
+        for bit, move, takeMove in pawnAttackMoveTable[color][square]:
+            if(enemy & bit):
+                moves.append(takeMove)
+                targets |= bit
+    
+    elif(pieceType == knightType):
+        sight = knightMasks[square]
+        for bit, move, takeMove in knightMoveTable[square]:
+            if(enemy & bit):
+                moves.append(takeMove)
+                targets |= bit
+            elif(not occupied & bit):
+                moves.append(move)
+                targets |= bit
+    
+    elif(pieceType == kingType):
+        #The reference generation never flags king moves as takes
+        sight = kingMasks[square]
+        for bit, move, takeMove in kingMoveTable[square]:
+            if(enemy & bit or not occupied & bit):
+                moves.append(move)
+                targets |= bit
+    
+    else:
+        #A sliding piece sees its targets and the first piece blocking each ray
+        blockers = 0
+        for ray in slidingMoveTables[pieceType][square]:
+            for bit, move, takeMove in ray:
+                if(occupied & bit):
+                    if(enemy & bit):
+                        moves.append(takeMove)
+                        targets |= bit
+                    blockers |= bit
+                    break
+                moves.append(move)
+                targets |= bit
+        sight = targets | blockers
+    
+    return moves, targets, sight
+
+
+piecesImagesDirectory = os.path.join(os.path.dirname(os.path.abspath(__file__)), "PiecesImages")
+
+#Name of the image of a piece in PiecesImages, e.g. white_knight.png
+def pieceImageName(pieceType, pieceColor):
+    return pieceColor.name.lower() + "_" + pieceType.name.lower() + ".png"
+
+
+initialFEN = "rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1"
+fenPieceTypes = {"p": ChessPieceType.PAWN, "n": ChessPieceType.KNIGHT, "b": ChessPieceType.BISHOP,
+                 "r": ChessPieceType.ROOK, "q": ChessPieceType.QUEEN, "k": ChessPieceType.KING}
+fenPieceLetters = {fenPieceTypes[letter]: letter for letter in fenPieceTypes}
+#Order of the pieces of each color in Chessboard.pieces, as initializeBoard adds them
+piecesListOrder = [ChessPieceType.PAWN, ChessPieceType.ROOK, ChessPieceType.KNIGHT, ChessPieceType.BISHOP, ChessPieceType.QUEEN, ChessPieceType.KING]
+#Castling right lost when a piece leaves or arrives at a corner square
+cornerCastlingRights = {squareIndex("H", 1): "K", squareIndex("A", 1): "Q", squareIndex("H", 8): "k", squareIndex("A", 8): "q"}
+
+#Process wide cache of the piece sprites. Sprites are keyed by piece type and color and
+#only read from disk the first time they are drawn, resized copies are cached per size
+class PieceSpriteCache:
+    
+    def __init__(self):
+        self.sprites = {}
+        self.resizedSprites = {}
+    
+    #Image names are looked up in the working directory first and then in PiecesImages
+    def resolveImagePath(self, pieceImageUrl):
+        if(os.path.exists(pieceImageUrl)):
+            return pieceImageUrl
+        return os.path.join(piecesImagesDirectory, os.path.basename(pieceImageUrl))
+    
+    def getSprite(self, pieceType, pieceColor, pieceImageUrl):
+        key = (pieceType, pieceColor)
+        if(not key in self.sprites):
+            with Image.open(self.resolveImagePath(pieceImageUrl)) as image:
+                self.sprites[key] = image.copy()
+        return self.sprites[key]
+    
+    def getResizedSprite(self, pieceType, pieceColor, pieceImageUrl, width, height):
+        key = (pieceType, pieceColor, width, height)
+        if(not key in self.resizedSprites):
+            self.resizedSprites[key] = self.getSprite(pieceType, pieceColor, pieceImageUrl).resize((width, height))
+        return self.resizedSprites[key]
+    
+    def clear(self):
+        self.sprites = {}
+        self.resizedSprites = {}
+
+pieceSpriteCache = PieceSpriteCache()
+
+
 class ChessPiece:
     
     def __init__(self, pieceType, pieceColor, pieceImageUrl, file, rank):
-        self.pieceImage = Image.open(pieceImageUrl)
+        #The image is loaded lazily through pieceSpriteCache, boards that are never drawn do not read it
+        self.pieceImageUrl = pieceImageUrl
         self.pieceType = pieceType
         self.availableMoves = []
         self.file = file
         self.rank = rank
         self.pieceColor = pieceColor
         self.moveCount = 0
+        #Bitboard of the destination squares of availableMoves
+        self.targets = 0
+        #Bitboard of the squares whose content availableMoves depends on
+        self.sight = 0
         
     
+    @property
+    def pieceImage(self):
+        return pieceSpriteCache.getSprite(self.pieceType, self.pieceColor, self.pieceImageUrl)
+    
     def getPieceImage(self, width, height):
-        return self.pieceImage.resize((width, height))
+        return pieceSpriteCache.getResizedSprite(self.pieceType, self.pieceColor, self.pieceImageUrl, width, height)
     
     def addMove(self, move):
         if(not move in self.availableMoves):
             self.availableMoves.append(move)
     
     def computeNewMoves(self, occupiedPositions, enemyPositions):
+        self.computeNewMovesFromBitboards(bitboardFromArray(occupiedPositions), bitboardFromArray(enemyPositions))
+    
+    #Original square by square move generation, kept as the reference the table driven
+    #generation is checked and benchmarked against
+    def computeNewMovesReference(self, occupiedPositions, enemyPositions):
         self.availableMoves = []
         coordinateTranslator = CoordinateTranslator()
         boardPosition = coordinateTranslator.translateCoordinates(self.file, self.rank)
@@ -423,6 +713,11 @@ class ChessPiece:
                         elif(occupiedPositions[boardPosition[0]+i, boardPosition[1]+j] == 0):
                             self.addMove(move)
         
+    #Generates the same moves as computeNewMovesReference, in the same order, with
+    #lookups in the precomputed move tables instead of walking the occupancy matrices
+    def computeNewMovesFromBitboards(self, occupied, enemy):
+        self.availableMoves, self.targets, self.sight = generatePieceMoves(self.pieceType.value, self.pieceColor.value, squareIndex(self.file, self.rank), self.moveCount == 0, occupied, enemy)
+    
     def movePiece(self, move, specialMove):    
         if(move in self.availableMoves and not specialMove):
             self.file = move.toPosition[0]
@@ -447,7 +742,14 @@ class ChessPiece:
 
 class Chessboard:
     
-    def __init__(self):
+    def __init__(self, backend = ChessboardBackend.NUMPY, incrementalUpdates = False, verbose = True, positionCache = None, fen = None):
+        self.backend = backend
+        self.verbose = verbose
+        #When True makeMove only regenerates the moves of the pieces that see the changed squares
+        self.incrementalUpdates = incrementalUpdates
+        self.bitboards = None
+        if(backend == ChessboardBackend.BITBOARD):
+            self.bitboards = ChessBitboard()
         self.occupiedPositions = np.zeros((8,8))
         self.whitePiecesPositions = np.zeros((8,8))
         self.blackPiecesPositions = np.zeros((8,8))
@@ -458,11 +760,34 @@ class Chessboard:
         self.blackCellsColor = "#44b1c2"
         self.taken = []
         self.moveCount = 0
-        self.initializeBoard()
+        #One entry per move done with makeMove, used by unmakeMove
+        self.undoStack = []
+        #Objects notified with onMovesChanged(chessboard, changes) after makeMove and unmakeMove
+        self.moveListeners = []
+        #PositionCache shared between boards, makeMove takes the moves of positions already
+        #seen from it instead of generating them
+        self.positionCache = positionCache
+        #Zobrist hash of the piece placement, updated by makeMove
+        self.zobristHash = 0
+        #Color of the next move, the opposite of the color of the last moved piece
+        self.sideToMove = ChessPieceColor.WHITE
+        #FEN state: castling rights as in FEN ("KQkq", "" for none), en passant square
+        #([file, rank] or None) and the halfmove clock and fullmove number
+        self.castlingRights = "KQkq"
+        self.enPassantSquare = None
+        self.halfmoveClock = 0
+        self.fullmoveNumber = 1
+        #See getAttackMap
+        self.attackMap = None
+        if(fen is not None):
+            self.loadFEN(fen)
+        else:
+            self.initializeBoard()
         
     #This function initializes the pieces in the right positions
     def initializeBoard(self):
-        print("Board initialization")
+        if(self.verbose):
+            print("Board initialization")
         #White pawns
         coordinateTranslator = CoordinateTranslator()
         pawnFiles = ["A","B","C","D","E","F","G","H"]
@@ -538,19 +863,239 @@ class Chessboard:
             elif(piece.pieceColor == ChessPieceColor.BLACK):
                 self.blackPiecesPositions[matrixPosition[0], matrixPosition[1]] = 1
             
+            if(self.bitboards is not None):
+                self.bitboards.addPiece(piece, squareIndex(piece.file, piece.rank))
+            
+        self.zobristHash = self.computeZobristHash()
         self.recomputeAvailableMoves()
             
     
+    #Replaces the position by the one of a FEN string. Pawns out of their initial rank count
+    #as moved, the pieces are listed in the order initializeBoard uses
+    def loadFEN(self, fen):
+        fields = fen.split()
+        if(len(fields) < 4):
+            raise ValueError("Incomplete FEN " + fen)
+        placementRows = fields[0].split("/")
+        if(len(placementRows) != 8):
+            raise ValueError("FEN placement needs 8 ranks " + fen)
+        
+        pieces = []
+        for i in range(0,8):
+            j = 0
+            for character in placementRows[i]:
+                if(character.isdigit()):
+                    j += int(character)
+                    continue
+                if(not character.lower() in fenPieceTypes or j > 7):
+                    raise ValueError("Bad FEN placement " + fields[0])
+                pieceType = fenPieceTypes[character.lower()]
+                pieceColor = ChessPieceColor.WHITE if character.isupper() else ChessPieceColor.BLACK
+                piece = ChessPiece(pieceType, pieceColor, pieceImageName(pieceType, pieceColor), squareFiles[8*i + j], squareRanks[8*i + j])
+                if(pieceType == ChessPieceType.PAWN and piece.rank != (2 if pieceColor == ChessPieceColor.WHITE else 7)):
+                    piece.moveCount = 1
+                pieces.append(piece)
+                j += 1
+            if(j != 8):
+                raise ValueError("Bad FEN placement " + fields[0])
+        pieces.sort(key = lambda piece: (piece.pieceColor.value, piecesListOrder.index(piece.pieceType), piece.file, piece.rank))
+        
+        if(not fields[1] in ["w", "b"]):
+            raise ValueError("Bad FEN side to move " + fields[1])
+        previousPieces = self.pieces
+        self.pieces = pieces
+        self.sideToMove = ChessPieceColor.WHITE if fields[1] == "w" else ChessPieceColor.BLACK
+        self.castlingRights = "" if fields[2] == "-" else fields[2]
+        self.enPassantSquare = None if fields[3] == "-" else [fields[3][0].upper(), int(fields[3][1])]
+        self.halfmoveClock = int(fields[4]) if len(fields) > 4 else 0
+        self.fullmoveNumber = int(fields[5]) if len(fields) > 5 else 1
+        self.moveCount = 2*(self.fullmoveNumber - 1) + self.sideToMove.value
+        self.taken = []
+        self.undoStack = []
+        
+        self.occupiedPositions = np.zeros((8,8))
+        self.whitePiecesPositions = np.zeros((8,8))
+        self.blackPiecesPositions = np.zeros((8,8))
+        if(self.bitboards is not None):
+            self.bitboards = ChessBitboard()
+        for piece in self.pieces:
+            square = squareIndex(piece.file, piece.rank)
+            self.occupiedPositions[square//8, square % 8] = 1
+            if(piece.pieceColor == ChessPieceColor.WHITE):
+                self.whitePiecesPositions[square//8, square % 8] = 1
+            else:
+                self.blackPiecesPositions[square//8, square % 8] = 1
+            if(self.bitboards is not None):
+                self.bitboards.addPiece(piece, square)
+        
+        self.zobristHash = self.computeZobristHash()
+        self.recomputeAvailableMoves()
+        if(len(self.moveListeners) > 0):
+            changes = [(piece, piece.availableMoves, []) for piece in previousPieces]
+            changes += [(piece, [], piece.availableMoves) for piece in self.pieces]
+            self.notifyMoveListeners(changes)
+    
+    def getFEN(self):
+        rows = []
+        for i in range(0,8):
+            row = ""
+            emptySquares = 0
+            for j in range(0,8):
+                piece = self.findPieceAtPosition(squareFiles[8*i + j], squareRanks[8*i + j])
+                if(piece == -1):
+                    emptySquares += 1
+                    continue
+                if(emptySquares > 0):
+                    row += str(emptySquares)
+                    emptySquares = 0
+                letter = fenPieceLetters[piece.pieceType]
+                row += letter.upper() if piece.pieceColor == ChessPieceColor.WHITE else letter
+            if(emptySquares > 0):
+                row += str(emptySquares)
+            rows.append(row)
+        enPassant = self.enPassantSquare[0].lower() + str(self.enPassantSquare[1]) if self.enPassantSquare is not None else "-"
+        fields = ["/".join(rows), "w" if self.sideToMove == ChessPieceColor.WHITE else "b", self.castlingRights if self.castlingRights != "" else "-",
+                  enPassant, str(self.halfmoveClock), str(self.fullmoveNumber)]
+        return " ".join(fields)
+    
+    #Updates the FEN state after a move of piece. The second half of a castling is done by
+    #the color that just moved and does not count as a new move
+    def updateFENState(self, piece, move, fromSquare, toSquare, capturedPiece):
+        newMove = piece.pieceColor == self.sideToMove
+        if(piece.pieceType == ChessPieceType.KING):
+            kingRights = "KQ" if piece.pieceColor == ChessPieceColor.WHITE else "kq"
+            self.castlingRights = "".join([right for right in self.castlingRights if not right in kingRights])
+        for square in [fromSquare, toSquare]:
+            if(square in cornerCastlingRights):
+                self.castlingRights = self.castlingRights.replace(cornerCastlingRights[square], "")
+        if(not newMove):
+            return
+        
+        self.enPassantSquare = None
+        if(piece.pieceType == ChessPieceType.PAWN and abs(move.toPosition[1] - move.fromPosition[1]) == 2):
+            self.enPassantSquare = [move.fromPosition[0], (move.fromPosition[1] + move.toPosition[1])//2]
+        if(piece.pieceType == ChessPieceType.PAWN or capturedPiece is not None):
+            self.halfmoveClock = 0
+        else:
+            self.halfmoveClock += 1
+        if(piece.pieceColor == ChessPieceColor.BLACK):
+            self.fullmoveNumber += 1
+    
+    def occupancyBitboards(self):
+        if(self.bitboards is not None):
+            return self.bitboards.occupied, self.bitboards.colorBitboards
+        #The occupancy matrices are read once per update instead of once per piece
+        occupied = bitboardFromArray(self.occupiedPositions)
+        colorBitboards = [bitboardFromArray(self.whitePiecesPositions), bitboardFromArray(self.blackPiecesPositions)]
+        return occupied, colorBitboards
+    
     def recomputeAvailableMoves(self):
+        if(self.bitboards is not None):
+            #The pieces are visited by color and type straight from the piece bitboards
+            bitboards = self.bitboards
+            occupied = bitboards.occupied
+            for color in range(0,2):
+                enemy = bitboards.colorBitboards[1 - color]
+                for pieceType in range(0,6):
+                    #iterateSquares written inline, this loop runs after every move
+                    bitboard = bitboards.pieceBitboards[color][pieceType]
+                    while(bitboard):
+                        lowestBit = bitboard & -bitboard
+                        bitboard ^= lowestBit
+                        square = lowestBit.bit_length() - 1
+                        piece = bitboards.squarePieces[square]
+                        piece.availableMoves, piece.targets, piece.sight = generatePieceMoves(pieceType, color, square, piece.moveCount == 0, occupied, enemy)
+            return
+        occupied, colorBitboards = self.occupancyBitboards()
         for i in range(0,len(self.pieces)):
-            if(self.pieces[i].pieceColor == ChessPieceColor.WHITE):
-                self.pieces[i].computeNewMoves(self.occupiedPositions, self.blackPiecesPositions)
-                
-            
-            elif(self.pieces[i].pieceColor == ChessPieceColor.BLACK):
-                self.pieces[i].computeNewMoves(self.occupiedPositions, self.whitePiecesPositions)
+            piece = self.pieces[i]
+            color = piece.pieceColor.value
+            piece.availableMoves, piece.targets, piece.sight = generatePieceMoves(piece.pieceType.value, color, squareIndex(piece.file, piece.rank), piece.moveCount == 0, occupied, colorBitboards[1 - color])
+    
+    def computeZobristHash(self):
+        zobristHash = 0
+        for piece in self.pieces:
+            zobristHash ^= zobristPieceKey(piece, squareIndex(piece.file, piece.rank))
+        return zobristHash
+    
+    #Key of the position in a PositionCache. The moves only depend on the placement of the
+    #pieces (pawns that have not moved are on their first rank), the hash covers it
+    def positionKey(self):
+        return (self.zobristHash, self.sideToMove.value)
+    
+    #Moves, targets and sight of every piece by square, as stored in a PositionCache
+    def positionMoves(self):
+        return {squareIndex(piece.file, piece.rank): (piece.availableMoves, piece.targets, piece.sight) for piece in self.pieces}
+    
+    def restorePositionMoves(self, positionMoves):
+        for piece in self.pieces:
+            piece.availableMoves, piece.targets, piece.sight = positionMoves[squareIndex(piece.file, piece.rank)]
+    
+    #AttackMap of the current position, computed the first time it is asked for
+    def getAttackMap(self):
+        if(self.attackMap is None or self.attackMap.zobristHash != self.zobristHash):
+            self.attackMap = AttackMap(self.pieces, self.zobristHash)
+        return self.attackMap
+    
+    #The moves of piece that do not leave its king in check. The first move of a pawn is
+    #generated without looking at the occupancy, here its pushes also need free squares
+    def getLegalMoves(self, piece):
+        attackMap = self.getAttackMap()
+        fromSquare = squareIndex(piece.file, piece.rank)
+        legalTargets = attackMap.getLegalTargets(piece.pieceType.value, piece.pieceColor.value, fromSquare) & ~attackMap.colorBitboards[piece.pieceColor.value]
+        legalMoves = []
+        for move in piece.availableMoves:
+            toSquare = squareIndex(move.toPosition[0], move.toPosition[1])
+            if(not legalTargets & squareBits[toSquare]):
+                continue
+            if(piece.pieceType == ChessPieceType.PAWN and not move.take):
+                pushedSquares = squareBits[toSquare]
+                if(abs(toSquare - fromSquare) == 16):
+                    pushedSquares |= squareBits[(fromSquare + toSquare)//2]
+                if(attackMap.occupied & pushedSquares):
+                    continue
+            legalMoves.append(move)
+        return legalMoves
+    
+    def isInCheck(self, pieceColor):
+        return self.getAttackMap().isInCheck(pieceColor.value)
+    
+    def piecesSeeingSquare(self, file, rank):
+        bit = squareBits[squareIndex(file, rank)]
+        return [piece for piece in self.pieces if piece.sight & bit]
+    
+    #Regenerates the moves of movedPiece and of the pieces whose sight contains one of
+    #changedSquares, the moves of every other piece do not depend on the changed squares.
+    #The previous moves of the regenerated pieces are appended to savedMoves when given
+    def updateAvailableMoves(self, movedPiece, changedSquares, savedMoves = None):
+        occupied, colorBitboards = self.occupancyBitboards()
+        changed = 0
+        for square in changedSquares:
+            changed |= squareBits[square]
+        for i in range(0,len(self.pieces)):
+            piece = self.pieces[i]
+            if(piece is movedPiece or piece.sight & changed):
+                if(savedMoves is not None):
+                    savedMoves.append((piece, piece.availableMoves, piece.targets, piece.sight))
+                color = piece.pieceColor.value
+                piece.availableMoves, piece.targets, piece.sight = generatePieceMoves(piece.pieceType.value, color, squareIndex(piece.file, piece.rank), piece.moveCount == 0, occupied, colorBitboards[1 - color])
+    
+    #Compares the moves kept by the incremental updates with a full recomputation and
+    #returns the pieces whose moves differed, after the call all the moves are recomputed
+    def checkIncrementalConsistency(self):
+        previousMoves = [piece.availableMoves for piece in self.pieces]
+        self.recomputeAvailableMoves()
+        inconsistentPieces = []
+        for i in range(0,len(self.pieces)):
+            if(previousMoves[i] != self.pieces[i].availableMoves):
+                inconsistentPieces.append(self.pieces[i])
+        return inconsistentPieces
     
     def findPieceIndexAtPosition(self, file, rank):
+        if(self.bitboards is not None):
+            piece = self.bitboards.pieceAt(squareIndex(file, rank))
+            return self.pieces.index(piece) if piece is not None else -1
+        
         for i in range(0,len(self.pieces)):
             piece = self.pieces[i]
             if(piece.file == file and piece.rank == rank):
@@ -559,6 +1104,10 @@ class Chessboard:
         return -1
     
     def findPieceAtPosition(self, file, rank):
+        if(self.bitboards is not None):
+            piece = self.bitboards.pieceAt(squareIndex(file, rank))
+            return piece if piece is not None else -1
+        
         for i in range(0,len(self.pieces)):
             piece = self.pieces[i]
             if(piece.file == file and piece.rank == rank):
@@ -566,19 +1115,49 @@ class Chessboard:
         
         return -1
     
-    def findPieceOfTypeThatCanGoToPosition(self, pieceType, file, rank, pieceColor, fromFile):
-        for i in range(0,len(self.pieces)):
-            piece = self.pieces[i]
-            if(piece.pieceType == pieceType and piece.pieceColor == pieceColor):
-                pieceMoves = piece.availableMoves
-                for j in range(0,len(pieceMoves)):
-                    if(pieceMoves[j].toPosition[0] == file and pieceMoves[j].toPosition[1] == rank):
-                        if(fromFile != -1 and piece.file == fromFile):
-                            return piece
-                        elif(fromFile == -1):
-                            return piece
+    #fromFile and fromRank disambiguate the piece when they are not -1
+    def findPieceOfTypeThatCanGoToPosition(self, pieceType, file, rank, pieceColor, fromFile, fromRank = -1):
+        if(self.bitboards is not None):
+            #Only the pieces of the requested type are visited, and the targets bitboard
+            #replaces the scan over their moves
+            targetBit = squareBits[squareIndex(file, rank)]
+            candidates = []
+            for square in iterateSquares(self.bitboards.pieceBitboards[pieceColor.value][pieceType.value]):
+                piece = self.bitboards.squarePieces[square]
+                if(piece.targets & targetBit and (fromFile == -1 or piece.file == fromFile) and (fromRank == -1 or piece.rank == fromRank)):
+                    candidates.append(piece)
+            candidates.sort(key = self.pieces.index)
+        else:
+            candidates = []
+            for i in range(0,len(self.pieces)):
+                piece = self.pieces[i]
+                if(piece.pieceType == pieceType and piece.pieceColor == pieceColor and (fromRank == -1 or piece.rank == fromRank)):
+                    pieceMoves = piece.availableMoves
+                    for j in range(0,len(pieceMoves)):
+                        if(pieceMoves[j].toPosition[0] == file and pieceMoves[j].toPosition[1] == rank):
+                            if(fromFile == -1 or piece.file == fromFile):
+                                candidates.append(piece)
+                            break
+        
+        if(len(candidates) == 0):
+            return None
+        if(len(candidates) > 1):
+            #SAN only disambiguates between pieces that can legally play the move, the
+            #pinned ones are left out. Otherwise the first piece of the list is taken
+            attackMap = self.getAttackMap()
+            toSquare = squareIndex(file, rank)
+            legalCandidates = [piece for piece in candidates if attackMap.isLegalMove(pieceType.value, pieceColor.value, squareIndex(piece.file, piece.rank), toSquare)]
+            if(len(legalCandidates) > 0):
+                candidates = legalCandidates
+        return candidates[0]
     
     def findColorPieceIndexAtPosition(self, file, rank, color):
+        if(self.bitboards is not None):
+            piece = self.bitboards.pieceAt(squareIndex(file, rank))
+            if(piece is not None and piece.pieceColor == color):
+                return self.pieces.index(piece)
+            return -1
+        
         for i in range(0,len(self.pieces)):
             piece = self.pieces[i]
             if(piece.file == file and piece.rank == rank and piece.pieceColor == color):
@@ -587,6 +1166,8 @@ class Chessboard:
         return -1
                 
         
+    #Returns False when the move is refused: no piece stands on its start square, or the
+    #piece cannot play it and it is not a special move
     def makeMove(self, move, specialMove):
         
         moveStartFile = move.fromPosition[0]
@@ -598,41 +1179,155 @@ class Chessboard:
             fromCoords = coordinateTranslator.translateCoordinates(moveStartFile, moveStartRank)
             toCoords = coordinateTranslator.translateCoordinates(move.toPosition[0], move.toPosition[1])
             #Movemos la pieza en nuestro tablero
-            legalMove = self.pieces[pieceIndex].movePiece(move, specialMove)
+            piece = self.pieces[pieceIndex]
+            previousPieceMoveCount = piece.moveCount
+            legalMove = piece.movePiece(move, specialMove)
             if(legalMove):
+                previousCells = (self.occupiedPositions[fromCoords[0], fromCoords[1]], self.whitePiecesPositions[fromCoords[0], fromCoords[1]], self.blackPiecesPositions[fromCoords[0], fromCoords[1]],
+                                 self.occupiedPositions[toCoords[0], toCoords[1]], self.whitePiecesPositions[toCoords[0], toCoords[1]], self.blackPiecesPositions[toCoords[0], toCoords[1]])
                 self.moveCount = self.moveCount+1
                 self.occupiedPositions[fromCoords[0], fromCoords[1]] = 0
                 self.occupiedPositions[toCoords[0], toCoords[1]] = 1
+                
+                if(piece.pieceColor == ChessPieceColor.WHITE):
+                    ownPositions = self.whitePiecesPositions
+                    enemyPositions = self.blackPiecesPositions
+                    enemyColor = ChessPieceColor.BLACK
+                else:
+                    ownPositions = self.blackPiecesPositions
+                    enemyPositions = self.whitePiecesPositions
+                    enemyColor = ChessPieceColor.WHITE
+                ownPositions[fromCoords[0], fromCoords[1]] = 0
+                ownPositions[toCoords[0], toCoords[1]] = 1
+                
+                enemyIndex = -1
+                if(move.take):
+                    enemyIndex = self.findColorPieceIndexAtPosition(move.toPosition[0],move.toPosition[1], enemyColor)
+                    enemyPositions[toCoords[0], toCoords[1]] = 0
+                
+                fromSquare = squareIndex(moveStartFile, moveStartRank)
+                toSquare = squareIndex(move.toPosition[0], move.toPosition[1])
+                if(self.bitboards is not None):
+                    if(enemyIndex != -1):
+                        self.bitboards.removePiece(self.pieces[enemyIndex], toSquare)
+                    self.bitboards.movePiece(piece, fromSquare, toSquare)
+                
+                capturedPiece = None
+                if(enemyIndex != -1):
+                    capturedPiece = self.pieces.pop(enemyIndex)
+                    self.taken.append(capturedPiece)
+                
+                previousHash = self.zobristHash
+                previousState = (self.sideToMove, self.castlingRights, self.enPassantSquare, self.halfmoveClock, self.fullmoveNumber)
+                self.updateFENState(piece, move, fromSquare, toSquare, capturedPiece)
+                self.zobristHash ^= zobristPieceKey(piece, fromSquare) ^ zobristPieceKey(piece, toSquare)
+                if(capturedPiece is not None):
+                    self.zobristHash ^= zobristPieceKey(capturedPiece, toSquare)
+                self.sideToMove = enemyColor
+                
+                previousPieceType = piece.pieceType
+                if(move.promotion is not None and piece.pieceType == ChessPieceType.PAWN):
+                    self.promotePiece(piece, move.promotion, toSquare)
+                
+                cachedMoves = None
+                if(self.positionCache is not None):
+                    cachedMoves = self.positionCache.get(self.positionKey(), "moves")
+                
+                savedMoves = []
+                if(cachedMoves is not None):
+                    savedMoves = [(other, other.availableMoves, other.targets, other.sight) for other in self.pieces]
+                    self.restorePositionMoves(cachedMoves)
+                elif(self.incrementalUpdates):
+                    self.updateAvailableMoves(piece, [fromSquare, toSquare], savedMoves)
+                else:
+                    savedMoves = [(other, other.availableMoves, other.targets, other.sight) for other in self.pieces]
+                    self.recomputeAvailableMoves()
+                if(self.positionCache is not None and cachedMoves is None):
+                    self.positionCache.put(self.positionKey(), "moves", self.positionMoves())
+                
+                self.undoStack.append((move, piece, previousPieceMoveCount, fromSquare, toSquare, previousCells, capturedPiece, enemyIndex, savedMoves, previousHash, previousState, previousPieceType))
+                
+                if(len(self.moveListeners) > 0):
+                    changes = [(savedPiece, availableMoves, savedPiece.availableMoves) for savedPiece, availableMoves, targets, sight in savedMoves if availableMoves != savedPiece.availableMoves]
+                    if(capturedPiece is not None):
+                        changes.append((capturedPiece, capturedPiece.availableMoves, []))
+                    self.notifyMoveListeners(changes)
+                return True
                     
-                if(self.pieces[pieceIndex].pieceColor == ChessPieceColor.WHITE):
-                    self.whitePiecesPositions[fromCoords[0], fromCoords[1]] = 0
-                    self.whitePiecesPositions[toCoords[0], toCoords[1]] = 1
-                        
-                    if(move.take):
-                        enemyIndex = self.findColorPieceIndexAtPosition(move.toPosition[0],move.toPosition[1], ChessPieceColor.BLACK)
-                        self.blackPiecesPositions[toCoords[0], toCoords[1]] = 0
-                        self.recomputeAvailableMoves()
-                        self.taken.append(self.pieces.pop(enemyIndex))
-                    else:
-                        self.recomputeAvailableMoves()
-                    
-                elif(self.pieces[pieceIndex].pieceColor == ChessPieceColor.BLACK):
-                    self.blackPiecesPositions[fromCoords[0], fromCoords[1]] = 0
-                    self.blackPiecesPositions[toCoords[0], toCoords[1]] = 1
-                    
-                    if(move.take):
-                        enemyIndex = self.findColorPieceIndexAtPosition(move.toPosition[0],move.toPosition[1], ChessPieceColor.WHITE)
-                        self.whitePiecesPositions[toCoords[0], toCoords[1]] = 0
-                        self.recomputeAvailableMoves()
-                        self.taken.append(self.pieces.pop(enemyIndex))
-                        
-                    else:
-                        self.recomputeAvailableMoves()
-                    
-            else:
+            elif(self.verbose):
                 print("Ilegal Move")
+        return False
                 
         
+    #Takes back the last move done with makeMove, restoring the pieces, the occupancy and
+    #the moves of the regenerated pieces from the undo stack. Returns the move taken back
+    def unmakeMove(self):
+        if(len(self.undoStack) == 0):
+            return None
+        move, piece, previousPieceMoveCount, fromSquare, toSquare, previousCells, capturedPiece, capturedIndex, savedMoves, previousHash, previousState, previousPieceType = self.undoStack.pop()
+        if(piece.pieceType != previousPieceType):
+            self.promotePiece(piece, previousPieceType, toSquare)
+        self.zobristHash = previousHash
+        self.sideToMove, self.castlingRights, self.enPassantSquare, self.halfmoveClock, self.fullmoveNumber = previousState
+        
+        piece.file = move.fromPosition[0]
+        piece.rank = move.fromPosition[1]
+        piece.moveCount = previousPieceMoveCount
+        self.moveCount = self.moveCount-1
+        
+        fromCoords = divmod(fromSquare, 8)
+        toCoords = divmod(toSquare, 8)
+        self.occupiedPositions[fromCoords], self.whitePiecesPositions[fromCoords], self.blackPiecesPositions[fromCoords] = previousCells[0:3]
+        self.occupiedPositions[toCoords], self.whitePiecesPositions[toCoords], self.blackPiecesPositions[toCoords] = previousCells[3:6]
+        
+        if(self.bitboards is not None):
+            self.bitboards.movePiece(piece, toSquare, fromSquare)
+        if(capturedPiece is not None):
+            self.taken.pop()
+            self.pieces.insert(capturedIndex, capturedPiece)
+            if(self.bitboards is not None):
+                self.bitboards.addPiece(capturedPiece, toSquare)
+        
+        notifyListeners = len(self.moveListeners) > 0
+        changes = []
+        if(notifyListeners and capturedPiece is not None):
+            changes.append((capturedPiece, [], capturedPiece.availableMoves))
+        for savedPiece, availableMoves, targets, sight in savedMoves:
+            if(notifyListeners and availableMoves != savedPiece.availableMoves):
+                changes.append((savedPiece, savedPiece.availableMoves, availableMoves))
+            savedPiece.availableMoves = availableMoves
+            savedPiece.targets = targets
+            savedPiece.sight = sight
+        
+        if(notifyListeners):
+            self.notifyMoveListeners(changes)
+        return move
+    
+    #Changes the type of the piece on square, for promotions and for taking them back
+    def promotePiece(self, piece, pieceType, square):
+        self.zobristHash ^= zobristPieceKey(piece, square)
+        if(self.bitboards is not None):
+            self.bitboards.removePiece(piece, square)
+        piece.pieceType = pieceType
+        piece.pieceImageUrl = pieceImageName(pieceType, piece.pieceColor)
+        if(self.bitboards is not None):
+            self.bitboards.addPiece(piece, square)
+        self.zobristHash ^= zobristPieceKey(piece, square)
+    
+    def addMoveListener(self, listener):
+        if(not listener in self.moveListeners):
+            self.moveListeners.append(listener)
+    
+    def removeMoveListener(self, listener):
+        if(listener in self.moveListeners):
+            self.moveListeners.remove(listener)
+    
+    #changes holds a (piece, previous moves, new moves) tuple for every piece whose moves
+    #changed, captured pieces go to an empty move list and come back from it on unmakeMove
+    def notifyMoveListeners(self, changes):
+        for listener in self.moveListeners:
+            listener.onMovesChanged(self, changes)
+    
     def displayBoard(self):
         fig, ax = plt.subplots(figsize = (5,5))
         for i in range(0,self.boardWidth):
@@ -1,7 +1,12 @@
 from ChessGame import CoordinateTranslator
 import matplotlib.pyplot as plt
+from matplotlib.collections import LineCollection
 import numpy as np
 from ChessGame import ChessPieceColor
+from ChessBitboard import squareIndex
+from ChessBitboard import squareName
+from ChessBitboard import iterateSquares
+from enum import Enum
 
 
 class ChessNode:
@@ -14,6 +19,9 @@ class ChessNode:
     
     def __eq__(self, other):
         return self.id == other.id
+    
+    def __hash__(self):
+        return hash(self.id)
 
         
 class ChessConnection:
@@ -25,10 +33,42 @@ class ChessConnection:
     def __eq__(self, other):
         return self.fromNodeId == other.fromNodeId and self.toNodeId == other.toNodeId
     
+    def __hash__(self):
+        return hash((self.fromNodeId, self.toNodeId))
+    
+
+#Storage of the connections of a Chessgraph, OBJECTS keeps a dictionary of ChessConnection
+#objects per node and ADJACENCY keeps a boolean adjacency matrix (and a weight matrix) indexed by node
+class ChessgraphBackend(Enum):
+    OBJECTS = 0
+    ADJACENCY = 1
+
+
+#Connections of the board graphs: MOVES joins a piece with the squares of its generated
+#moves, ATTACKS with the squares it attacks (defended pieces included) and LEGAL_MOVES with
+#the squares of its moves that do not leave its king in check. ATTACKS and LEGAL_MOVES are
+#read from the AttackMap of the board
+class ChessgraphEdges(Enum):
+    MOVES = 0
+    ATTACKS = 1
+    LEGAL_MOVES = 2
+
+
+#How displayGraph draws: LINES makes one line per connection and per node, BATCHED draws all
+#the connections as one LineCollection and all the nodes as one scatter
+class ChessgraphRendering(Enum):
+    LINES = 0
+    BATCHED = 1
+
 
 class Chessgraph:
     
-    def __init__(self):
+    def __init__(self, backend = ChessgraphBackend.OBJECTS, edges = ChessgraphEdges.MOVES):
+        self.backend = backend
+        self.edges = edges
+        #Set by bindToChessboard
+        self.boundChessboard = None
+        self.boundColor = None
         self.restartGraph()
         self.nodesColor = "#b38aff"
         self.connectionColor = "#8ad4ed"
@@ -37,27 +77,39 @@ class Chessgraph:
     
     def restartGraph(self):
         self.nodes = []
+        #Node id -> position in nodes. Nodes are indexed in insertion order, the board graphs add
+        #the squares in the order of the occupancy matrices so the index is the bitboard square
+        self.nodeIndices = {}
+        #Node id -> {connection: connection} for the connections leaving the node
         self.connections = {}
+        #A restarted graph no longer follows the board it was bound to, unbinding also clears
+        #the degree of every node and the degree histogram kept while bound
+        self.unbindChessboard()
+        if(self.backend == ChessgraphBackend.ADJACENCY):
+            self.adjacency = np.zeros((64,64), dtype = bool)
+            self.weights = np.zeros((64,64))
         
     
     def addNode(self, node):
-        if(not node in self.nodes):
+        if(not node.id in self.nodeIndices):
+            nodeIndex = len(self.nodes)
+            self.nodeIndices[node.id] = nodeIndex
             self.nodes.append(node)
-            self.connections[node.id] = []
+            if(self.backend == ChessgraphBackend.ADJACENCY):
+                if(nodeIndex == len(self.adjacency)):
+                    self.adjacency = np.pad(self.adjacency, (0, nodeIndex))
+                    self.weights = np.pad(self.weights, (0, nodeIndex))
+            else:
+                self.connections[node.id] = {}
     
     def getNode(self, nodeId):
-        for i in range(0,len(self.nodes)):
-            if(self.nodes[i].id == nodeId):
-                return self.nodes[i]
+        if(nodeId in self.nodeIndices):
+            return self.nodes[self.nodeIndices[nodeId]]
         
         return -1
     
     def containsNode(self, nodeId):
-        for i in range(0,len(self.nodes)):
-            if(self.nodes[i].id == nodeId):
-                return True
-        
-        return False
+        return nodeId in self.nodeIndices
     
     def initializeFromChessboard(self, chessboard):
         self.restartGraph()
@@ -71,6 +123,14 @@ class Chessgraph:
                 node = ChessNode(nodeName, chessCoords2[0], chessCoords2[1],self.nodesColor)
                 self.addNode(node)
         
+        if(self.edges != ChessgraphEdges.MOVES):
+            self.addAttackMapConnections(chessboard, chessboard.pieces)
+            return
+        
+        if(self.backend == ChessgraphBackend.ADJACENCY):
+            self.addPiecesConnections(chessboard.pieces)
+            return
+        
         #Connections according to pieces
         pieces = chessboard.pieces
         nPieces = len(pieces)
@@ -97,6 +157,14 @@ class Chessgraph:
                 node = ChessNode(nodeName, chessCoords2[0], chessCoords[1], self.nodesColor)
                 self.addNode(node)
         
+        if(self.edges != ChessgraphEdges.MOVES):
+            self.addAttackMapConnections(chessboard, [piece for piece in chessboard.pieces if piece.pieceColor == piecesColor])
+            return
+        
+        if(self.backend == ChessgraphBackend.ADJACENCY):
+            self.addPiecesConnections([piece for piece in chessboard.pieces if piece.pieceColor == piecesColor])
+            return
+        
         pieces = chessboard.pieces
         nPieces = len(pieces)
         for i in range(0,nPieces):
@@ -114,24 +182,145 @@ class Chessgraph:
             
                     
     
+    #Sets the connections of all the moves of pieces at once, every connection has weight 1.
+    #Only used by the adjacency backend on the 64 square graph
+    def addPiecesConnections(self, pieces):
+        fromSquares = []
+        toSquares = []
+        for piece in pieces:
+            for move in piece.availableMoves:
+                fromSquares.append(squareIndex(move.fromPosition[0], move.fromPosition[1]))
+                toSquares.append(squareIndex(move.toPosition[0], move.toPosition[1]))
+        newConnections = ~self.adjacency[fromSquares, toSquares]
+        self.weights[np.array(fromSquares, dtype = int)[newConnections], np.array(toSquares, dtype = int)[newConnections]] = 1
+        self.adjacency[fromSquares, toSquares] = True
+    
+    #Connections of pieces taken from the AttackMap of the board, for the ATTACKS and
+    #LEGAL_MOVES edges
+    def addAttackMapConnections(self, chessboard, pieces):
+        attackMap = chessboard.getAttackMap()
+        for piece in pieces:
+            square = squareIndex(piece.file, piece.rank)
+            if(self.edges == ChessgraphEdges.ATTACKS):
+                targets = attackMap.pieceAttacks[square]
+            else:
+                targets = piece.targets & attackMap.getLegalTargets(piece.pieceType.value, piece.pieceColor.value, square)
+            if(self.backend == ChessgraphBackend.ADJACENCY):
+                toSquares = list(iterateSquares(targets))
+                self.adjacency[square, toSquares] = True
+                self.weights[square, toSquares] = 1
+                continue
+            for toSquare in iterateSquares(targets):
+                self.addConnection(squareName(square), squareName(toSquare), 1)
+    
     def addConnection(self, startNodeId, endNodeId, weight):
+        if(self.backend == ChessgraphBackend.ADJACENCY):
+            if(self.containsNode(startNodeId) and self.containsNode(endNodeId)):
+                startIndex = self.nodeIndices[startNodeId]
+                endIndex = self.nodeIndices[endNodeId]
+                if(not self.adjacency[startIndex, endIndex]):
+                    self.adjacency[startIndex, endIndex] = True
+                    self.weights[startIndex, endIndex] = weight
+                    if(self.degreeHistogram is not None):
+                        self.updateDegree(startNodeId, 1)
+            return
+        
         if(self.containsNode(startNodeId) and self.containsNode(endNodeId)):
             newConnection = ChessConnection(startNodeId, endNodeId, weight)
             if(not newConnection in self.connections[startNodeId]):
-                self.connections[startNodeId].append(newConnection)
+                self.connections[startNodeId][newConnection] = newConnection
+                if(self.degreeHistogram is not None):
+                    self.updateDegree(startNodeId, 1)
+    
+    def removeConnection(self, startNodeId, endNodeId):
+        if(self.backend == ChessgraphBackend.ADJACENCY):
+            if(self.containsNode(startNodeId) and self.containsNode(endNodeId)):
+                startIndex = self.nodeIndices[startNodeId]
+                endIndex = self.nodeIndices[endNodeId]
+                if(self.adjacency[startIndex, endIndex]):
+                    self.adjacency[startIndex, endIndex] = False
+                    self.weights[startIndex, endIndex] = 0
+                    if(self.degreeHistogram is not None):
+                        self.updateDegree(startNodeId, -1)
+            return
+        
+        if(self.containsNode(startNodeId)):
+            connection = ChessConnection(startNodeId, endNodeId, 0)
+            if(connection in self.connections[startNodeId]):
+                del self.connections[startNodeId][connection]
+                if(self.degreeHistogram is not None):
+                    self.updateDegree(startNodeId, -1)
+    
+    def updateDegree(self, nodeId, change):
+        degree = self.nodeDegrees[nodeId]
+        self.degreeHistogram[degree] -= 1
+        self.degreeHistogram[degree + change] += 1
+        self.nodeDegrees[nodeId] = degree + change
+    
+    #Builds the graph of the pieces of piecesColor (all the pieces when None) and keeps it up
+    #to date: after every makeMove/unmakeMove of the board only the connections of the pieces
+    #whose moves changed are removed and added again, and the degree histogram is updated with them
+    def bindToChessboard(self, chessboard, piecesColor = None):
+        if(self.edges != ChessgraphEdges.MOVES):
+            raise ValueError("Only graphs of the generated moves can be bound to a board")
+        self.unbindChessboard()
+        if(piecesColor is None):
+            self.initializeFromChessboard(chessboard)
+        else:
+            self.initializeFromChessboardColored(chessboard, piecesColor)
+        
+        xVals, self.degreeHistogram = self.getDegreeDistribution()
+        if(self.backend == ChessgraphBackend.ADJACENCY):
+            degrees = self.getAdjacencyMatrix().sum(axis = 1)
+            self.nodeDegrees = {self.nodes[i].id: int(degrees[i]) for i in range(0,len(self.nodes))}
+        else:
+            self.nodeDegrees = {node.id: len(self.connections[node.id]) for node in self.nodes}
+        self.boundChessboard = chessboard
+        self.boundColor = piecesColor
+        chessboard.addMoveListener(self)
+    
+    def unbindChessboard(self):
+        if(self.boundChessboard is not None):
+            self.boundChessboard.removeMoveListener(self)
+        self.boundChessboard = None
+        self.boundColor = None
+        self.nodeDegrees = None
+        self.degreeHistogram = None
+    
+    def onMovesChanged(self, chessboard, changes):
+        #Every removal goes first, a square can lose the connections of a captured piece and
+        #get the ones of the piece that took it
+        for piece, previousMoves, newMoves in changes:
+            if(self.boundColor is None or piece.pieceColor == self.boundColor):
+                for move in previousMoves:
+                    self.removeConnection(move.fromPosition[0] + str(move.fromPosition[1]), move.toPosition[0] + str(move.toPosition[1]))
+        for piece, previousMoves, newMoves in changes:
+            if(self.boundColor is None or piece.pieceColor == self.boundColor):
+                for move in newMoves:
+                    self.addConnection(move.fromPosition[0] + str(move.fromPosition[1]), move.toPosition[0] + str(move.toPosition[1]), 1)
     
     def getAllConnections(self):
+        if(self.backend == ChessgraphBackend.ADJACENCY):
+            return [ChessConnection(self.nodes[i].id, self.nodes[j].id, self.weights[i, j]) for i, j in self.getEdgeArray()]
+        
         connections = []
         for i in range(0,len(self.nodes)):
-            nodeConnections = self.connections[self.nodes[i].id]
-            for j in range(0,len(nodeConnections)):
-                connections.append(nodeConnections[j])
+            connections.extend(self.connections[self.nodes[i].id].values())
         
         return connections
     
                 
-    def displayGraph(self):
+    def displayGraph(self, rendering = ChessgraphRendering.LINES):
         plt.figure(figsize = (7,7))
+        if(rendering == ChessgraphRendering.BATCHED):
+            ax = plt.gca()
+            ax.add_collection(LineCollection(self.getEdgeSegments(), colors = self.connectionColor, linewidths = 5, alpha = 0.5))
+            coordinates = self.getNodeCoordinates()
+            ax.scatter(coordinates[:, 0], coordinates[:, 1], s = 30**2, c = [node.color for node in self.nodes], zorder = 2)
+            for node in self.nodes:
+                ax.text(node.x, node.y, node.id, horizontalalignment = "center", verticalalignment = "center", zorder = 3)
+            ax.autoscale_view()
+            return
         
         #We get all the connections
         connections = self.getAllConnections()
@@ -148,7 +337,41 @@ class Chessgraph:
             plt.plot(node.x, node.y, color = node.color, markersize = 30, marker = "o")
             plt.text(node.x,node.y, node.id, horizontalalignment = "center", verticalalignment = "center")
     
+    def getNumberOfConnections(self):
+        if(self.backend == ChessgraphBackend.ADJACENCY):
+            return int(self.getAdjacencyMatrix().sum())
+        return sum([len(nodeConnections) for nodeConnections in self.connections.values()])
+    
+    #Edges as an (edges, 2) array of node indices
+    def getEdgeArray(self):
+        return np.argwhere(self.getAdjacencyMatrix())
+    
+    #(nodes, 2) array with the x and y of every node
+    def getNodeCoordinates(self):
+        return np.array([[node.x, node.y] for node in self.nodes], dtype = float).reshape((len(self.nodes), 2))
+    
+    #(edges, 2, 2) array with the start and end points of every connection, as LineCollection takes them
+    def getEdgeSegments(self):
+        return self.getNodeCoordinates()[self.getEdgeArray()]
+    
+    def getAdjacencyMatrix(self):
+        nNodes = len(self.nodes)
+        if(self.backend == ChessgraphBackend.ADJACENCY):
+            return self.adjacency[0:nNodes, 0:nNodes]
+        
+        adjacency = np.zeros((nNodes, nNodes), dtype = bool)
+        for connection in self.getAllConnections():
+            adjacency[self.nodeIndices[connection.fromNodeId], self.nodeIndices[connection.toNodeId]] = True
+        return adjacency
+    
     def getDegreeDistribution(self):
+        if(self.degreeHistogram is not None):
+            return list(range(0,64)), self.degreeHistogram.copy()
+        
+        if(self.backend == ChessgraphBackend.ADJACENCY):
+            degrees = self.getAdjacencyMatrix().sum(axis = 1)
+            return list(range(0,64)), np.bincount(degrees, minlength = 64)[0:64].astype(float)
+        
         degreeDistribution = np.zeros(64)
         for i in range(0,len(self.nodes)):
             connections = self.connections[self.nodes[i].id]
@@ -158,6 +381,11 @@ class Chessgraph:
     
     def getMeanDegree(self):
         xVals, yVals = self.getDegreeDistribution()
+        if(self.backend == ChessgraphBackend.ADJACENCY):
+            if(yVals.sum() > 0):
+                return np.sum(np.arange(0,64)*(yVals/yVals.sum()))
+            return 0
+        
         if(sum(yVals) > 0):
             yVals = yVals/sum(yVals)
             meanDegree = 0
@@ -0,0 +1,144 @@
+import numpy as np
+from scipy import sparse
+from scipy.sparse import csgraph
+
+#Metrics of batches of square graphs. Every function takes a (plies, nodes, nodes) boolean
+#adjacency tensor, like GameConnectivity.adjacency[color] or np.stack of
+#Chessgraph.getAdjacencyMatrix() (a single graph is adjacency[np.newaxis]), and computes
+#the metric of all the graphs at once with array operations, with no loop over plies
+
+
+#Block diagonal CSR matrix of the graphs, node i of ply p is row p*nodes + i. The index
+#arrays are built once from the nonzero entries and shared with the matrix, not copied
+def toCSRMatrix(adjacency):
+    adjacency = np.asarray(adjacency, dtype = bool)
+    nPlies, nNodes = adjacency.shape[0], adjacency.shape[1]
+    plies, rows, columns = np.nonzero(adjacency)
+    indptr = np.zeros(nPlies*nNodes + 1, dtype = np.int64)
+    np.cumsum(np.bincount(plies*nNodes + rows, minlength = nPlies*nNodes), out = indptr[1:])
+    indices = (plies*nNodes + columns).astype(np.int64)
+    return sparse.csr_matrix((np.ones(len(indices), dtype = np.int8), indices, indptr), shape = (nPlies*nNodes, nPlies*nNodes), copy = False)
+
+#Connections leaving every square, (plies, nodes)
+def getOutDegrees(adjacency):
+    return np.asarray(adjacency).sum(axis = 2)
+
+#Connections arriving at every square, (plies, nodes)
+def getInDegrees(adjacency):
+    return np.asarray(adjacency).sum(axis = 1)
+
+#Weakly (strong = False) or strongly connected components. Returns the component label of
+#every node, (plies, nodes), the number of components of every ply and the size of its
+#largest component. Squares without connections are components of one square
+def getConnectedComponents(adjacency, strong = False):
+    nPlies, nNodes = adjacency.shape[0], adjacency.shape[1]
+    nComponents, labels = csgraph.connected_components(toCSRMatrix(adjacency), directed = True, connection = "strong" if strong else "weak")
+    nodePlies = np.repeat(np.arange(0,nPlies), nNodes)
+    #Components never leave their ply's block
+    componentPlies = np.zeros(nComponents, dtype = np.int64)
+    componentPlies[labels] = nodePlies
+    componentCounts = np.bincount(componentPlies, minlength = nPlies)
+    largestComponents = np.zeros(nPlies, dtype = np.int64)
+    np.maximum.at(largestComponents, componentPlies, np.bincount(labels, minlength = nComponents))
+    return labels.reshape((nPlies, nNodes)), componentCounts, largestComponents
+
+#Clustering coefficient of every node in the undirected graph (a connection in either
+#direction joins two squares): the triangles through the node over the pairs of its
+#neighbours, 0 for nodes with fewer than two neighbours. Returns (plies, nodes) and the
+#average over the nodes of every ply
+def getClustering(adjacency):
+    undirected = np.logical_or(adjacency, np.swapaxes(adjacency, 1, 2))
+    nNodes = undirected.shape[1]
+    undirected[:, np.arange(0,nNodes), np.arange(0,nNodes)] = False
+    undirected = undirected.astype(np.float64)
+    #Diagonal of A^3 counts every triangle twice
+    triangles = ((undirected @ undirected)*undirected).sum(axis = 2)/2
+    degrees = undirected.sum(axis = 2)
+    pairs = degrees*(degrees - 1)/2
+    clustering = np.divide(triangles, pairs, out = np.zeros_like(triangles), where = pairs > 0)
+    return clustering, clustering.mean(axis = 1)
+
+#Breadth first search from every node of every ply at once. Returns the number of moves
+#from node s to node t, (plies, nodes, nodes) with -1 when t cannot be reached, and the
+#number of shortest paths between them
+def getShortestPaths(adjacency):
+    nPlies, nNodes = adjacency.shape[0], adjacency.shape[1]
+    steps = np.asarray(adjacency, dtype = np.float64)
+    distances = np.full((nPlies, nNodes, nNodes), -1, dtype = np.int64)
+    pathCounts = np.zeros((nPlies, nNodes, nNodes))
+    #Path counts of the nodes found in the last level
+    level = np.broadcast_to(np.eye(nNodes), (nPlies, nNodes, nNodes)).copy()
+    reached = level > 0
+    distances[reached] = 0
+    pathCounts[reached] = 1
+    for length in range(1,nNodes):
+        level = level @ steps
+        newNodes = (level > 0) & ~reached
+        if(not newNodes.any()):
+            break
+        level[~newNodes] = 0
+        distances[newNodes] = length
+        pathCounts[newNodes] = level[newNodes]
+        reached |= newNodes
+    return distances, pathCounts
+
+#Squares every square reaches in at most k moves, itself included, (plies, nodes, nodes)
+def getReachability(adjacency, k):
+    reachable = np.broadcast_to(np.eye(adjacency.shape[1], dtype = bool), adjacency.shape).copy()
+    steps = np.asarray(adjacency, dtype = np.float64)
+    for i in range(0,k):
+        reachable |= (reachable.astype(np.float64) @ steps) > 0
+    return reachable
+
+#PageRank of every node, (plies, nodes), by power iteration on all the plies together. Nodes
+#without connections spread their rank over every node
+def getPageRank(adjacency, damping = 0.85, tolerance = 1e-10, maxIterations = 200):
+    nPlies, nNodes = adjacency.shape[0], adjacency.shape[1]
+    steps = np.asarray(adjacency, dtype = np.float64)
+    degrees = steps.sum(axis = 2)
+    transitions = np.divide(steps, degrees[:, :, np.newaxis], out = np.zeros_like(steps), where = degrees[:, :, np.newaxis] > 0)
+    dangling = degrees == 0
+    ranks = np.full((nPlies, nNodes), 1/nNodes)
+    for iteration in range(0,maxIterations):
+        danglingRank = (ranks*dangling).sum(axis = 1, keepdims = True)
+        newRanks = damping*((ranks[:, np.newaxis, :] @ transitions)[:, 0, :] + danglingRank/nNodes) + (1 - damping)/nNodes
+        change = np.abs(newRanks - ranks).sum(axis = 1).max()
+        ranks = newRanks
+        if(change < tolerance):
+            break
+    return ranks
+
+#Betweenness centrality of every node, (plies, nodes): for every pair of other nodes s, t
+#the fraction of the shortest paths from s to t that go through the node. The dependencies
+#of Brandes' algorithm are accumulated one distance level at a time, from the farthest, for
+#every source and ply together. normalized divides by the (nodes - 1)(nodes - 2) ordered pairs
+def getBetweenness(adjacency, normalized = True):
+    nPlies, nNodes = adjacency.shape[0], adjacency.shape[1]
+    distances, pathCounts = getShortestPaths(adjacency)
+    stepsTransposed = np.swapaxes(np.asarray(adjacency, dtype = np.float64), 1, 2)
+    #dependencies[p, s, v]: shortest paths from s through v, weighted by the targets beyond v
+    dependencies = np.zeros((nPlies, nNodes, nNodes))
+    for level in range(int(distances.max()) - 1, 0, -1):
+        nextLevel = distances == level + 1
+        weights = np.divide(1 + dependencies, pathCounts, out = np.zeros_like(dependencies), where = nextLevel)
+        currentLevel = distances == level
+        dependencies[currentLevel] = (pathCounts*(weights @ stepsTransposed))[currentLevel]
+    betweenness = dependencies.sum(axis = 1)
+    if(normalized and nNodes > 2):
+        betweenness /= (nNodes - 1)*(nNodes - 2)
+    return betweenness
+
+#One value per ply of every metric, e.g. for the plies of a GameConnectivity
+def getConnectivitySummary(adjacency, k = 2):
+    adjacency = np.asarray(adjacency, dtype = bool)
+    weakLabels, weakComponents, largestWeakComponent = getConnectedComponents(adjacency)
+    strongLabels, strongComponents, largestStrongComponent = getConnectedComponents(adjacency, True)
+    return {"meanDegree": getOutDegrees(adjacency).mean(axis = 1),
+            "weakComponents": weakComponents,
+            "largestWeakComponent": largestWeakComponent,
+            "strongComponents": strongComponents,
+            "largestStrongComponent": largestStrongComponent,
+            "averageClustering": getClustering(adjacency)[1],
+            "meanReachable": getReachability(adjacency, k).sum(axis = 2).mean(axis = 1) - 1,
+            "maxPageRank": getPageRank(adjacency).max(axis = 1),
+            "maxBetweenness": getBetweenness(adjacency).max(axis = 1)}
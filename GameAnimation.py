@@ -0,0 +1,181 @@
+import os
+import subprocess
+import numpy as np
+import matplotlib
+from matplotlib.figure import Figure
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.colors import to_rgba
+from PIL import Image
+from ChessGame import Chessboard
+from ChessGame import ChessboardBackend
+from ChessGame import CoordinateTranslator
+from ChessGame import getPlyLength
+from ChessGame import pieceSpriteCache
+from ChessBitboard import squareIndex
+
+
+#Renders the plies of a game without pyplot, on its own Agg canvas, so the matplotlib backend
+#of the process is left alone. The board background is drawn once and
+#saved, every piece is an image artist with its sprite scaled once to the size of a cell,
+#and each frame only restores the background of the squares that changed and draws the
+#pieces standing on them again. Castlings (two special moves) give a single frame
+class GameAnimation:
+
+    def __init__(self, moves, specialMoveValues, figureSize = 5, dpi = 80, boardBackend = ChessboardBackend.BITBOARD):
+        self.moves = moves
+        self.specialMoveValues = specialMoveValues
+        self.boardBackend = boardBackend
+        self.board = Chessboard(boardBackend, verbose = False)
+        self.coordinateTranslator = CoordinateTranslator()
+
+        self.figure = Figure(figsize = (figureSize, figureSize), dpi = dpi)
+        self.canvas = FigureCanvasAgg(self.figure)
+        self.ax = self.figure.add_subplot()
+        #Same cell colors as Chessboard.displayBoard, in one image instead of 64 patches
+        cells = np.zeros((8, 8, 4))
+        for i in range(0,8):
+            for j in range(0,8):
+                color = self.board.whiteCellsColor if (i + j) % 2 == 1 else self.board.blackCellsColor
+                cells[j, i] = to_rgba(color)
+        self.ax.imshow(cells, origin = "lower", extent = (0, 8, 0, 8), interpolation = "nearest")
+        self.ax.set_xlim([0,8])
+        self.ax.set_ylim([0,8])
+        self.ax.set_xticks([i + 0.5 for i in range(0,8)])
+        self.ax.set_xticklabels(self.coordinateTranslator.fileNotation)
+        self.ax.set_yticks([i + 0.5 for i in range(0,8)])
+        self.ax.set_yticklabels([str(i) for i in range(1,9)])
+        self.canvas.draw()
+        self.background = self.canvas.copy_from_bbox(self.figure.bbox)
+
+        #Sprites are scaled to the cell size in pixels so drawing them does not resample
+        self.cellSize = max(1, int(round(self.ax.get_window_extent().width/8)))
+        self.spriteArrays = {}
+        #Piece -> (image artist, square it is drawn on, piece type it is drawn as)
+        self.pieceArtists = {}
+        for piece in self.board.pieces:
+            artist = self.ax.imshow(self.getSpriteArray(piece), extent = self.getCellExtent(piece.file, piece.rank), animated = True, interpolation = "nearest")
+            self.pieceArtists[piece] = [artist, squareIndex(piece.file, piece.rank), piece.pieceType]
+        #Moving an image would otherwise rescale the axes to its extent
+        self.ax.set_xlim([0,8])
+        self.ax.set_ylim([0,8])
+        self.ax.set_autoscale_on(False)
+
+    #Puts the board and the piece artists back in the initial position, every export replays
+    #the game from the start. The artists are reused in the order of the board pieces
+    def resetPosition(self):
+        self.board = Chessboard(self.boardBackend, verbose = False)
+        artists = [self.pieceArtists[piece][0] for piece in self.pieceArtists]
+        self.pieceArtists = {}
+        for piece, artist in zip(self.board.pieces, artists):
+            artist.set_extent(self.getCellExtent(piece.file, piece.rank))
+            artist.set_data(self.getSpriteArray(piece))
+            artist.set_visible(True)
+            self.pieceArtists[piece] = [artist, squareIndex(piece.file, piece.rank), piece.pieceType]
+
+    def getSpriteArray(self, piece):
+        key = (piece.pieceType, piece.pieceColor)
+        if(not key in self.spriteArrays):
+            sprite = pieceSpriteCache.getResizedSprite(piece.pieceType, piece.pieceColor, piece.pieceImageUrl, self.cellSize, self.cellSize)
+            self.spriteArrays[key] = np.asarray(sprite.convert("RGBA"))
+        return self.spriteArrays[key]
+
+    def getCellExtent(self, file, rank):
+        x, y = self.coordinateTranslator.translateCoordinatesForImage(file, rank)
+        return (x, x + 1, y - 1, y)
+
+    #Pixel box (x1, y1, x2, y2) of a square for restore_region, with y going down from the
+    #top of the figure
+    def getCellBox(self, square):
+        file = "ABCDEFGH"[square % 8]
+        rank = 8 - square//8
+        x1, x2, y1, y2 = self.getCellExtent(file, rank)
+        (left, bottom), (right, top) = self.ax.transData.transform([(x1, y1), (x2, y2)])
+        height = self.canvas.get_width_height()[1]
+        return (int(round(left)), int(round(height - top)), int(round(right)), int(round(height - bottom)))
+
+    def getFrame(self):
+        return np.asarray(self.canvas.buffer_rgba()).copy()
+
+    #Draws the whole position, used for the first frame
+    def drawPosition(self):
+        self.canvas.restore_region(self.background)
+        for piece in self.pieceArtists:
+            artist = self.pieceArtists[piece][0]
+            if(artist.get_visible()):
+                self.ax.draw_artist(artist)
+        return self.getFrame()
+
+    #Moves the artists of the pieces that changed square, type or were captured, and
+    #redraws only the squares involved
+    def updateFrame(self):
+        changedSquares = set()
+        boardPieces = set(self.board.pieces)
+        for piece in self.pieceArtists:
+            artist, square, pieceType = self.pieceArtists[piece]
+            if(not piece in boardPieces):
+                if(artist.get_visible()):
+                    artist.set_visible(False)
+                    changedSquares.add(square)
+                continue
+            newSquare = squareIndex(piece.file, piece.rank)
+            if(newSquare != square or piece.pieceType != pieceType or not artist.get_visible()):
+                changedSquares.add(square)
+                changedSquares.add(newSquare)
+                artist.set_extent(self.getCellExtent(piece.file, piece.rank))
+                artist.set_visible(True)
+                if(piece.pieceType != pieceType):
+                    artist.set_data(self.getSpriteArray(piece))
+                self.pieceArtists[piece] = [artist, newSquare, piece.pieceType]
+
+        for square in changedSquares:
+            #xy is the lower left corner of the saved region, the whole figure
+            self.canvas.restore_region(self.background, bbox = self.getCellBox(square), xy = (0, 0))
+        for piece in boardPieces:
+            if(self.pieceArtists[piece][1] in changedSquares):
+                self.ax.draw_artist(self.pieceArtists[piece][0])
+        return self.getFrame()
+
+    #Yields the RGBA frames of the game: the initial position and the position after every move
+    def iterateFrames(self):
+        self.resetPosition()
+        yield self.drawPosition()
+        i = 0
+        while(i < len(self.moves)):
+            plyLength = getPlyLength(self.moves, self.specialMoveValues, i)
+            for j in range(i,i + plyLength):
+                self.board.makeMove(self.moves[j], self.specialMoveValues[j])
+            i += plyLength
+            yield self.updateFrame()
+
+    def saveFrames(self, directory, prefix = "frame"):
+        os.makedirs(directory, exist_ok = True)
+        paths = []
+        for frameNumber, frame in enumerate(self.iterateFrames()):
+            path = os.path.join(directory, prefix + ("%04d" % frameNumber) + ".png")
+            Image.fromarray(frame).save(path)
+            paths.append(path)
+        return paths
+
+    def saveGIF(self, path, framesPerSecond = 2):
+        frames = [Image.fromarray(frame).convert("RGB").quantize(method = Image.Quantize.MEDIANCUT) for frame in self.iterateFrames()]
+        frames[0].save(path, save_all = True, append_images = frames[1:], duration = int(1000/framesPerSecond), loop = 0)
+
+    #The frames are piped to ffmpeg (matplotlib's animation.ffmpeg_path) as raw video
+    def saveMP4(self, path, framesPerSecond = 2):
+        width, height = self.canvas.get_width_height()
+        command = [matplotlib.rcParams["animation.ffmpeg_path"], "-y", "-loglevel", "error", "-f", "rawvideo", "-pix_fmt", "rgba",
+                   "-s", str(width) + "x" + str(height), "-r", str(framesPerSecond), "-i", "-",
+                   "-vf", "pad=ceil(iw/2)*2:ceil(ih/2)*2", "-pix_fmt", "yuv420p", path]
+        try:
+            process = subprocess.Popen(command, stdin = subprocess.PIPE)
+        except FileNotFoundError:
+            raise RuntimeError("ffmpeg was not found, set matplotlib.rcParams[\"animation.ffmpeg_path\"] or use saveGIF")
+        for frame in self.iterateFrames():
+            process.stdin.write(frame.tobytes())
+        process.stdin.close()
+        if(process.wait() != 0):
+            raise RuntimeError("ffmpeg could not write " + path)
+
+    @classmethod
+    def fromGame(cls, game, figureSize = 5, dpi = 80):
+        return cls(game.moves, game.specialMoveValues, figureSize, dpi)
@@ -0,0 +1,79 @@
+import numpy as np
+from ChessGame import Chessboard
+from ChessGame import ChessPieceColor
+from ChessGame import ChessboardBackend
+from ChessBitboard import squareIndex
+from ChessBitboard import iterateSquares
+
+
+#Connectivity of a whole game in one object. The game is replayed once and, for each color,
+#the adjacency matrices of the graphs Chessgraph.initializeFromChessboardColored would build
+#after every ply are stacked in a (plies, 64, 64) boolean tensor. Nodes are the squares in
+#the order of the Chessgraph nodes (A8, B8, ..., H1). Degree statistics are reductions over
+#the tensors, no Chessgraph is built
+class GameConnectivity:
+
+    def __init__(self, moves, specialMoveValues, includeInitialPosition = False, boardBackend = ChessboardBackend.BITBOARD):
+        board = Chessboard(boardBackend, incrementalUpdates = True, verbose = False)
+        nPlies = len(moves) + (1 if includeInitialPosition else 0)
+        #(ply, from, to) of every connection, per color
+        connections = [([], [], []), ([], [], [])]
+
+        ply = 0
+        if(includeInitialPosition):
+            self.addBoardConnections(board, ply, connections)
+            ply += 1
+        for i in range(0,len(moves)):
+            board.makeMove(moves[i], specialMoveValues[i])
+            self.addBoardConnections(board, ply, connections)
+            ply += 1
+
+        self.adjacency = {}
+        for color in ChessPieceColor:
+            tensor = np.zeros((nPlies, 64, 64), dtype = bool)
+            plyIndices, fromSquares, toSquares = connections[color.value]
+            tensor[plyIndices, fromSquares, toSquares] = True
+            self.adjacency[color] = tensor
+
+    @classmethod
+    def fromGame(cls, game, includeInitialPosition = False):
+        return cls(game.moves, game.specialMoveValues, includeInitialPosition)
+
+    def addBoardConnections(self, board, ply, connections):
+        for piece in board.pieces:
+            plyIndices, fromSquares, toSquares = connections[piece.pieceColor.value]
+            fromSquare = squareIndex(piece.file, piece.rank)
+            for toSquare in iterateSquares(piece.targets):
+                plyIndices.append(ply)
+                fromSquares.append(fromSquare)
+                toSquares.append(toSquare)
+
+    def getNumberOfPlies(self):
+        return len(self.adjacency[ChessPieceColor.WHITE])
+
+    #Adjacency packed to bits along the destination square, (plies, 64, 8) uint8
+    def getPackedAdjacency(self, color):
+        return np.packbits(self.adjacency[color], axis = 2)
+
+    @staticmethod
+    def unpackAdjacency(packedAdjacency):
+        return np.unpackbits(packedAdjacency, axis = 2, count = 64).astype(bool)
+
+    #Connections leaving every square, (plies, 64). This is the degree Chessgraph uses
+    def getOutDegrees(self, color):
+        return self.adjacency[color].sum(axis = 2)
+
+    #Connections arriving at every square, (plies, 64)
+    def getInDegrees(self, color):
+        return self.adjacency[color].sum(axis = 1)
+
+    #Same values as Chessgraph.getDegreeDistribution for every ply, (plies, 64)
+    def getDegreeDistributions(self, color):
+        degrees = self.getOutDegrees(color)
+        nPlies = len(degrees)
+        offsets = degrees + 64*np.arange(0,nPlies)[:, np.newaxis]
+        return np.bincount(offsets.ravel(), minlength = 64*nPlies).reshape((nPlies, 64)).astype(float)
+
+    #Same values as Chessgraph.getMeanDegree for every ply, (plies,)
+    def getMeanDegrees(self, color):
+        return self.getOutDegrees(color).sum(axis = 1)/64
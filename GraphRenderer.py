@@ -0,0 +1,106 @@
+import os
+import numpy as np
+from matplotlib.figure import Figure
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.collections import LineCollection
+from PIL import Image
+from ChessGame import ChessPieceColor
+from ChessGame import ChessboardBackend
+from ChessBitboard import squareName
+from GameConnectivity import GameConnectivity
+
+#Position of the node of every square, as Chessgraph places them (file index, rank)
+squareCoordinates = np.array([[square % 8, 8 - square//8] for square in range(0,64)], dtype = float)
+#Diameter of the node markers in points, as in Chessgraph.displayGraph
+nodeSize = 30
+
+
+#Draws board graphs side by side to images without pyplot, so no window is opened whatever
+#the matplotlib backend is. The figure, the axes and their titles are drawn once and saved;
+#every graph only changes the segments of the LineCollection of its axes, which is drawn
+#with the nodes over the saved background. The labels are drawn once too: they lie inside
+#the opaque node discs, so the pixels of the disc interiors are copied from a layer rendered
+#at construction. Graphs are given as 64x64 adjacency matrices over the squares (A8, B8,
+#..., H1), the order of the Chessgraph nodes and of GameConnectivity
+class ChessgraphRenderer:
+
+    def __init__(self, columns = 1, titles = None, figureSize = 7, dpi = 72, showLabels = True, nodesColor = "#b38aff", connectionColor = "#8ad4ed"):
+        self.figure = Figure(figsize = (figureSize*columns, figureSize), dpi = dpi)
+        self.canvas = FigureCanvasAgg(self.figure)
+        self.axes = self.figure.subplots(1, columns, squeeze = False)[0]
+        #Animated artists of every axes: (connections, nodes)
+        self.artists = []
+        labels = []
+        for i in range(0,columns):
+            ax = self.axes[i]
+            ax.set_xlim([-0.75, 7.75])
+            ax.set_ylim([0.25, 8.75])
+            if(titles is not None):
+                ax.set_title(titles[i])
+            connections = LineCollection([], colors = connectionColor, linewidths = 5, alpha = 0.5, animated = True)
+            ax.add_collection(connections)
+            nodes = ax.scatter(squareCoordinates[:, 0], squareCoordinates[:, 1], s = nodeSize**2, c = nodesColor, zorder = 2, animated = True)
+            if(showLabels):
+                labels.extend([ax.text(squareCoordinates[square, 0], squareCoordinates[square, 1], squareName(square), horizontalalignment = "center", verticalalignment = "center", zorder = 3, animated = True) for square in range(0,64)])
+            self.artists.append((connections, nodes))
+        self.canvas.draw()
+        self.background = self.canvas.copy_from_bbox(self.figure.bbox)
+
+        self.labelsMask = None
+        if(showLabels):
+            for i in range(0,columns):
+                self.axes[i].draw_artist(self.artists[i][1])
+            for label in labels:
+                label.axes.draw_artist(label)
+            self.labelsLayer = np.asarray(self.canvas.buffer_rgba()).copy()
+            self.labelsMask = self.getDiscInteriors()
+
+    #Pixels fully inside a node disc, two pixels away from its antialiased border
+    def getDiscInteriors(self):
+        width, height = self.canvas.get_width_height()
+        radius = nodeSize/2*self.figure.dpi/72 - 2
+        rows, columns = np.mgrid[0:height, 0:width]
+        mask = np.zeros((height, width), dtype = bool)
+        for ax in self.axes:
+            for x, y in ax.transData.transform(squareCoordinates):
+                #Buffer rows go down from the top of the figure
+                mask |= (columns + 0.5 - x)**2 + (rows + 0.5 - (height - y))**2 < radius**2
+        return mask
+
+    #RGBA image of the graphs, one adjacency matrix per column
+    def renderAdjacencies(self, adjacencies):
+        self.canvas.restore_region(self.background)
+        for i in range(0,len(adjacencies)):
+            connections, nodes = self.artists[i]
+            connections.set_segments(squareCoordinates[np.argwhere(adjacencies[i])])
+            self.axes[i].draw_artist(connections)
+            self.axes[i].draw_artist(nodes)
+        frame = np.asarray(self.canvas.buffer_rgba()).copy()
+        if(self.labelsMask is not None):
+            frame[self.labelsMask] = self.labelsLayer[self.labelsMask]
+        return frame
+
+    #Same for Chessgraph objects built on a board
+    def renderGraphs(self, graphs):
+        return self.renderAdjacencies([graph.getAdjacencyMatrix() for graph in graphs])
+
+    def saveAdjacencies(self, adjacencies, path):
+        #Fast PNG compression, the images are written one per ply
+        Image.fromarray(self.renderAdjacencies(adjacencies)).save(path, compress_level = 1)
+
+    def saveGraphs(self, graphs, path):
+        self.saveAdjacencies([graph.getAdjacencyMatrix() for graph in graphs], path)
+
+
+#Writes the graphs of colors after every ply of a game (and the initial position) side by
+#side, one PNG per ply in directory. Returns the paths of the images
+def saveGameGraphs(moves, specialMoveValues, directory, colors = [ChessPieceColor.WHITE, ChessPieceColor.BLACK], prefix = "ply", figureSize = 7, dpi = 72, boardBackend = ChessboardBackend.BITBOARD):
+    os.makedirs(directory, exist_ok = True)
+    connectivity = GameConnectivity(moves, specialMoveValues, True, boardBackend)
+    renderer = ChessgraphRenderer(len(colors), [color.name.capitalize() for color in colors], figureSize, dpi)
+    paths = []
+    for ply in range(0,connectivity.getNumberOfPlies()):
+        path = os.path.join(directory, prefix + ("%04d" % ply) + ".png")
+        renderer.saveAdjacencies([connectivity.adjacency[color][ply] for color in colors], path)
+        paths.append(path)
+    return paths
@@ -0,0 +1,150 @@
+import time
+import inspect
+import functools
+import PGNReader
+import ChessGame
+from ChessGame import Chessboard
+from ChessGraph import Chessgraph
+
+#Opt in timers and counters of the hot paths. enable() wraps the instrumented functions
+#and disable() puts the originals back, so while disabled the code runs untouched.
+#Timers are inclusive: makeMove time also contains the move generation it triggers
+enabled = False
+#Timer name -> [calls, seconds]
+timers = {}
+#Counter name -> value
+counters = {}
+#(owner, attribute, original function) of every wrapped function while enabled
+wrappedFunctions = []
+
+
+def addTime(name, seconds):
+    timer = timers.get(name)
+    if(timer is None):
+        timer = [0, 0.0]
+        timers[name] = timer
+    timer[0] += 1
+    timer[1] += seconds
+
+def addCount(name, value = 1):
+    counters[name] = counters.get(name, 0) + value
+
+def reset():
+    timers.clear()
+    counters.clear()
+
+#Signature of the original function, the wrapper is not inspected
+findPieceSignature = inspect.signature(Chessboard.findPieceOfTypeThatCanGoToPosition)
+
+#Counters of each instrumented function, computed from its positional and keyword arguments
+#and its result
+def countParsedMoves(arguments, keywordArguments, result):
+    addCount("sanMovesParsed", len(result[2]))
+
+def countFullRecompute(arguments, keywordArguments, result):
+    addCount("fullRecomputes")
+
+def countIncrementalUpdate(arguments, keywordArguments, result):
+    addCount("incrementalUpdates")
+
+def countGeneratedMoves(arguments, keywordArguments, result):
+    addCount("movesGenerated", len(result[0]))
+
+def countScannedPieces(arguments, keywordArguments, result):
+    boundArguments = findPieceSignature.bind(*arguments, **keywordArguments).arguments
+    chessboard, pieceType, pieceColor = boundArguments["self"], boundArguments["pieceType"], boundArguments["pieceColor"]
+    addCount("pieceLookups")
+    #The bitboard backend only visits the pieces of the type and color, the numpy one goes
+    #through the whole list of pieces
+    if(chessboard.bitboards is not None):
+        addCount("piecesScanned", len([piece for piece in chessboard.pieces if piece.pieceType == pieceType and piece.pieceColor == pieceColor]))
+    else:
+        addCount("piecesScanned", len(chessboard.pieces))
+
+def countGraphEdges(arguments, keywordArguments, result):
+    addCount("graphsBuilt")
+    addCount("graphEdgesAdded", arguments[0].getNumberOfConnections())
+
+#owner, attribute, timer name and counter function of the instrumented functions
+instrumentedFunctions = [(PGNReader, "parseMovetext", "PGNReader.parseMovetext", countParsedMoves),
+                         (Chessboard, "makeMove", "Chessboard.makeMove", None),
+                         (Chessboard, "recomputeAvailableMoves", "Chessboard.recomputeAvailableMoves", countFullRecompute),
+                         (Chessboard, "updateAvailableMoves", "Chessboard.updateAvailableMoves", countIncrementalUpdate),
+                         (Chessboard, "findPieceOfTypeThatCanGoToPosition", "Chessboard.findPieceOfTypeThatCanGoToPosition", countScannedPieces),
+                         (ChessGame, "generatePieceMoves", "ChessGame.generatePieceMoves", countGeneratedMoves),
+                         (Chessgraph, "initializeFromChessboard", "Chessgraph.initialize", countGraphEdges),
+                         (Chessgraph, "initializeFromChessboardColored", "Chessgraph.initialize", countGraphEdges)]
+
+def instrumentFunction(function, name, counter):
+    @functools.wraps(function)
+    def instrumented(*arguments, **keywordArguments):
+        start = time.perf_counter()
+        result = function(*arguments, **keywordArguments)
+        addTime(name, time.perf_counter() - start)
+        if(counter is not None):
+            counter(arguments, keywordArguments, result)
+        return result
+    return instrumented
+
+def enable():
+    global enabled
+    if(enabled):
+        return
+    for owner, attribute, name, counter in instrumentedFunctions:
+        original = getattr(owner, attribute)
+        wrappedFunctions.append((owner, attribute, original))
+        setattr(owner, attribute, instrumentFunction(original, name, counter))
+    enabled = True
+
+def disable():
+    global enabled
+    while(len(wrappedFunctions) > 0):
+        owner, attribute, original = wrappedFunctions.pop()
+        setattr(owner, attribute, original)
+    enabled = False
+
+#Plain dictionary copy of the timers and counters, it can be pickled back from a worker
+def snapshot():
+    return {"timers": {name: {"calls": timers[name][0], "seconds": timers[name][1]} for name in timers},
+            "counters": dict(counters)}
+
+#Sums snapshots, e.g. the ones returned by the workers of a pool
+def mergeSnapshots(snapshots):
+    merged = {"timers": {}, "counters": {}}
+    for values in snapshots:
+        for name in values["timers"]:
+            timer = merged["timers"].setdefault(name, {"calls": 0, "seconds": 0.0})
+            timer["calls"] += values["timers"][name]["calls"]
+            timer["seconds"] += values["timers"][name]["seconds"]
+        for name in values["counters"]:
+            merged["counters"][name] = merged["counters"].get(name, 0) + values["counters"][name]
+    return merged
+
+#Calls function with instrumentation enabled and returns its result with the snapshot of
+#that call only. Used as the task of pool workers, whose counters stay in their process.
+#The previous timers, counters and enabled state are restored afterwards
+def instrumentedCall(function, item):
+    wasEnabled = enabled
+    previousTimers = {name: list(timers[name]) for name in timers}
+    previousCounters = dict(counters)
+    reset()
+    enable()
+    try:
+        result = function(item)
+        values = snapshot()
+    finally:
+        if(not wasEnabled):
+            disable()
+        reset()
+        timers.update(previousTimers)
+        counters.update(previousCounters)
+    return result, values
+
+def printSnapshot(values):
+    print("Timer".ljust(48) + "Calls".rjust(12) + "Time (ms)".rjust(14))
+    for name in sorted(values["timers"], key = lambda name: -values["timers"][name]["seconds"]):
+        timer = values["timers"][name]
+        print(name.ljust(48) + str(timer["calls"]).rjust(12) + ("%.2f" % (timer["seconds"]*1e3)).rjust(14))
+    print("Counter".ljust(48) + "Value".rjust(12))
+    for name in sorted(values["counters"]):
+        print(name.ljust(48) + str(values["counters"][name]).rjust(12))
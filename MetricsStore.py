@@ -0,0 +1,174 @@
+import os
+import re
+import numpy as np
+from ChessGame import Chessboard
+from ChessGame import ChessPieceColor
+from ChessGame import ChessboardBackend
+from PositionCache import positionConnectivity
+
+#Columns of the store, name: (dtype, shape of the value of one ply). The degree
+#distributions count squares, so they fit in a byte per degree
+metricsColumns = {"whiteMeanDegree": (np.float64, ()),
+                  "blackMeanDegree": (np.float64, ()),
+                  "whiteDegreeDistribution": (np.uint8, (64,)),
+                  "blackDegreeDistribution": (np.uint8, (64,))}
+indexDtype = np.dtype([("gameId", np.int64), ("start", np.int64), ("plies", np.int32)])
+segmentPattern = re.compile(r'^index\.(\d+)\.npy$')
+
+
+#Append only store of per ply metrics. Games are buffered and written in segments: every
+#segment is one .npy file per column (whiteMeanDegree.00000.npy, ...) holding the plies of
+#its games one after the other, and index.00000.npy with the game id, first ply and number
+#of plies of each game. The index of a segment is written last, segments without it are
+#ignored. Segments are opened as memory maps, the columns of a game are views of them
+class MetricsStore:
+
+    def __init__(self, directory, segmentPlies = 100000):
+        self.directory = directory
+        #The buffered games are written when they reach this number of plies
+        self.segmentPlies = segmentPlies
+        os.makedirs(directory, exist_ok = True)
+        self.bufferedColumns = {column: [] for column in metricsColumns}
+        self.bufferedIndex = []
+        self.bufferedPlies = 0
+        self.openSegments()
+
+    def segmentPath(self, name, segment):
+        return os.path.join(self.directory, name + "." + ("%05d" % segment) + ".npy")
+
+    def openSegments(self):
+        segments = []
+        for fileName in os.listdir(self.directory):
+            match = segmentPattern.match(fileName)
+            if(match):
+                segments.append(int(match.group(1)))
+        self.segments = sorted(segments)
+        self.segmentIndices = [np.load(self.segmentPath("index", segment), mmap_mode = "r") for segment in self.segments]
+        self.segmentColumns = [{column: np.load(self.segmentPath(column, segment), mmap_mode = "r") for column in metricsColumns} for segment in self.segments]
+        #Segment and position in the segment index of every game, in order of appending
+        gameCounts = [len(index) for index in self.segmentIndices]
+        self.gameSegments = np.repeat(np.arange(0,len(self.segments)), gameCounts)
+        self.gamePositions = np.concatenate([np.arange(0,count) for count in gameCounts]) if len(gameCounts) > 0 else np.zeros(0, dtype = int)
+
+    #metrics holds an array of the plies of the game for every column
+    def appendGame(self, metrics, gameId = None):
+        plies = len(metrics["whiteMeanDegree"])
+        for column in metricsColumns:
+            dtype, shape = metricsColumns[column]
+            values = np.asarray(metrics[column], dtype = dtype).reshape((plies,) + shape)
+            self.bufferedColumns[column].append(values)
+        if(gameId is None):
+            gameId = len(self) + len(self.bufferedIndex)
+        self.bufferedIndex.append((gameId, self.bufferedPlies, plies))
+        self.bufferedPlies += plies
+        if(self.bufferedPlies >= self.segmentPlies):
+            self.flush()
+
+    def appendGames(self, games, positionCache = None, boardBackend = ChessboardBackend.BITBOARD):
+        for game in games:
+            self.appendGame(computeGameMetrics(game, positionCache, boardBackend))
+
+    #Writes the buffered games as a new segment
+    def flush(self):
+        if(len(self.bufferedIndex) == 0):
+            return
+        segment = self.segments[-1] + 1 if len(self.segments) > 0 else 0
+        for column in metricsColumns:
+            np.save(self.segmentPath(column, segment), np.concatenate(self.bufferedColumns[column]))
+            self.bufferedColumns[column] = []
+        np.save(self.segmentPath("index", segment), np.array(self.bufferedIndex, dtype = indexDtype))
+        self.bufferedIndex = []
+        self.bufferedPlies = 0
+        self.openSegments()
+
+    def close(self):
+        self.flush()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exceptionType, exceptionValue, traceback):
+        self.close()
+
+    #Number of written games, the buffered ones are not counted until flush
+    def __len__(self):
+        return len(self.gameSegments)
+
+    def getNumberOfPlies(self):
+        return sum([len(columns["whiteMeanDegree"]) for columns in self.segmentColumns])
+
+    def getGameId(self, gameNumber):
+        return int(self.segmentIndices[self.gameSegments[gameNumber]][self.gamePositions[gameNumber]]["gameId"])
+
+    #View of the plies of one game in the memory map of its segment
+    def getGameColumn(self, gameNumber, column):
+        segment = self.gameSegments[gameNumber]
+        entry = self.segmentIndices[segment][self.gamePositions[gameNumber]]
+        return self.segmentColumns[segment][column][int(entry["start"]):int(entry["start"]) + int(entry["plies"])]
+
+    def getGameMetrics(self, gameNumber):
+        return {column: self.getGameColumn(gameNumber, column) for column in metricsColumns}
+
+    #Memory maps of a column, one per segment
+    def getColumnSegments(self, column):
+        return [columns[column] for columns in self.segmentColumns]
+
+    #Whole column, a memory map when the store has a single segment (see compact)
+    def getColumn(self, column):
+        segments = self.getColumnSegments(column)
+        if(len(segments) == 1):
+            return segments[0]
+        dtype, shape = metricsColumns[column]
+        if(len(segments) == 0):
+            return np.zeros((0,) + shape, dtype = dtype)
+        return np.concatenate(segments)
+
+    #Ply at which every game starts in getColumn and its number of plies
+    def getGameOffsets(self):
+        segmentStarts = np.cumsum([0] + [len(columns["whiteMeanDegree"]) for columns in self.segmentColumns])
+        if(len(self) == 0):
+            return np.zeros(0, dtype = np.int64), np.zeros(0, dtype = np.int64)
+        starts = segmentStarts[self.gameSegments] + np.concatenate([index["start"] for index in self.segmentIndices])
+        plies = np.concatenate([index["plies"] for index in self.segmentIndices]).astype(np.int64)
+        return starts, plies
+
+    #Rewrites every segment as a single one, so whole columns are memory maps too
+    def compact(self):
+        self.flush()
+        if(len(self.segments) <= 1):
+            return
+        oldSegments = self.segments
+        starts, plies = self.getGameOffsets()
+        index = np.zeros(len(self), dtype = indexDtype)
+        index["gameId"] = np.concatenate([segmentIndex["gameId"] for segmentIndex in self.segmentIndices])
+        index["start"] = starts
+        index["plies"] = plies
+        segment = oldSegments[-1] + 1
+        for column in metricsColumns:
+            np.save(self.segmentPath(column, segment), self.getColumn(column))
+        np.save(self.segmentPath("index", segment), index)
+        #Indices first, a segment without index is ignored
+        self.segmentIndices = []
+        self.segmentColumns = []
+        for oldSegment in oldSegments:
+            os.remove(self.segmentPath("index", oldSegment))
+        for oldSegment in oldSegments:
+            for column in metricsColumns:
+                os.remove(self.segmentPath(column, oldSegment))
+        self.openSegments()
+
+
+#Per ply metrics of a parsed game, the same values Chessgraph.getDegreeDistribution and
+#getMeanDegree give for the white and black graphs after every move
+def computeGameMetrics(game, positionCache = None, boardBackend = ChessboardBackend.BITBOARD):
+    board = Chessboard(boardBackend, verbose = False, positionCache = positionCache)
+    metrics = {column: [] for column in metricsColumns}
+    for i in range(0,len(game.moves)):
+        board.makeMove(game.moves[i], game.specialMoveValues[i])
+        whiteDistribution, whiteMeanDegree = positionConnectivity(board, ChessPieceColor.WHITE, positionCache)
+        blackDistribution, blackMeanDegree = positionConnectivity(board, ChessPieceColor.BLACK, positionCache)
+        metrics["whiteMeanDegree"].append(whiteMeanDegree)
+        metrics["blackMeanDegree"].append(blackMeanDegree)
+        metrics["whiteDegreeDistribution"].append(whiteDistribution)
+        metrics["blackDegreeDistribution"].append(blackDistribution)
+    return metrics
@@ -0,0 +1,253 @@
+import re
+import json
+import functools
+from ChessGame import Chessboard
+from ChessGame import ChessPieceColor
+from ChessGame import ChessboardBackend
+from ChessGame import getPlyLength
+from PGNReader import PGNGame
+from PGNReader import iterateGameTexts
+from PositionCache import PositionCache
+from PositionCache import positionConnectivity
+from BatchAnalysis import mapInPool
+
+moveNumberPattern = re.compile(r'^\d+\.+')
+#Check, mate and annotation marks, PGNGame.sanMoves are stored without them
+sanSuffixPattern = re.compile(r'[+#!?]+$')
+resultNames = ["White", "Black", "None"]
+
+
+#Game count, results, ECO codes and the running mean and variance (Welford) of the white and
+#black mean degree of the games that reached a node
+class RunningStatistics:
+
+    def __init__(self):
+        self.gameCount = 0
+        self.whiteMean = 0.0
+        self.whiteM2 = 0.0
+        self.blackMean = 0.0
+        self.blackM2 = 0.0
+        #Games won by white, won by black and without a winner
+        self.results = {"White": 0, "Black": 0, "None": 0}
+        self.ecoCounts = {}
+
+    def addGame(self, whiteDegree, blackDegree, winner, eco):
+        self.gameCount += 1
+        whiteDelta = whiteDegree - self.whiteMean
+        self.whiteMean += whiteDelta/self.gameCount
+        self.whiteM2 += whiteDelta*(whiteDegree - self.whiteMean)
+        blackDelta = blackDegree - self.blackMean
+        self.blackMean += blackDelta/self.gameCount
+        self.blackM2 += blackDelta*(blackDegree - self.blackMean)
+        self.results[str(winner)] += 1
+        if(eco is not None):
+            self.ecoCounts[eco] = self.ecoCounts.get(eco, 0) + 1
+
+    #Combines the statistics of two disjoint sets of games (Chan et al. update)
+    def merge(self, other):
+        if(other.gameCount == 0):
+            return
+        gameCount = self.gameCount + other.gameCount
+        whiteDelta = other.whiteMean - self.whiteMean
+        blackDelta = other.blackMean - self.blackMean
+        self.whiteM2 += other.whiteM2 + whiteDelta*whiteDelta*self.gameCount*other.gameCount/gameCount
+        self.blackM2 += other.blackM2 + blackDelta*blackDelta*self.gameCount*other.gameCount/gameCount
+        self.whiteMean += whiteDelta*other.gameCount/gameCount
+        self.blackMean += blackDelta*other.gameCount/gameCount
+        self.gameCount = gameCount
+        for result in resultNames:
+            self.results[result] += other.results[result]
+        for eco in other.ecoCounts:
+            self.ecoCounts[eco] = self.ecoCounts.get(eco, 0) + other.ecoCounts[eco]
+
+    def getWhiteVariance(self):
+        return self.whiteM2/self.gameCount if self.gameCount > 0 else 0
+
+    def getBlackVariance(self):
+        return self.blackM2/self.gameCount if self.gameCount > 0 else 0
+
+    #Most frequent ECO code of the games, None when no game had one
+    def getEco(self):
+        if(len(self.ecoCounts) == 0):
+            return None
+        return max(self.ecoCounts, key = self.ecoCounts.get)
+
+    def toDict(self):
+        return {"gameCount": self.gameCount, "whiteMean": self.whiteMean, "whiteM2": self.whiteM2,
+                "blackMean": self.blackMean, "blackM2": self.blackM2, "results": self.results, "ecoCounts": self.ecoCounts}
+
+    @classmethod
+    def fromDict(cls, values):
+        statistics = cls()
+        statistics.gameCount = values["gameCount"]
+        statistics.whiteMean = values["whiteMean"]
+        statistics.whiteM2 = values["whiteM2"]
+        statistics.blackMean = values["blackMean"]
+        statistics.blackM2 = values["blackM2"]
+        statistics.results = dict(values["results"])
+        statistics.ecoCounts = dict(values["ecoCounts"])
+        return statistics
+
+
+#A node of the tree is the position reached by a sequence of SAN moves. Its statistics are
+#split in Elo bands (the lower Elo of the two players divided by the band width, -1 when a
+#player has no Elo) so Elo filters are lookups too
+class OpeningNode:
+
+    def __init__(self):
+        self.children = {}
+        self.bandStatistics = {}
+
+    def getChild(self, sanMove, create = False):
+        child = self.children.get(sanMove)
+        if(child is None and create):
+            child = OpeningNode()
+            self.children[sanMove] = child
+        return child
+
+    def addGame(self, eloBand, whiteDegree, blackDegree, winner, eco):
+        if(not eloBand in self.bandStatistics):
+            self.bandStatistics[eloBand] = RunningStatistics()
+        self.bandStatistics[eloBand].addGame(whiteDegree, blackDegree, winner, eco)
+
+    def merge(self, other):
+        for eloBand in other.bandStatistics:
+            if(not eloBand in self.bandStatistics):
+                self.bandStatistics[eloBand] = RunningStatistics()
+            self.bandStatistics[eloBand].merge(other.bandStatistics[eloBand])
+        for sanMove in other.children:
+            self.getChild(sanMove, True).merge(other.children[sanMove])
+
+    def toDict(self):
+        return {"statistics": {str(eloBand): self.bandStatistics[eloBand].toDict() for eloBand in self.bandStatistics},
+                "children": {sanMove: self.children[sanMove].toDict() for sanMove in self.children}}
+
+    @classmethod
+    def fromDict(cls, values):
+        node = cls()
+        for eloBand in values["statistics"]:
+            node.bandStatistics[int(eloBand)] = RunningStatistics.fromDict(values["statistics"][eloBand])
+        for sanMove in values["children"]:
+            node.children[sanMove] = cls.fromDict(values["children"][sanMove])
+        return node
+
+
+#Trie over the SAN moves of the games (PGNGame.sanMoves) down to maxDepth moves. Every node
+#accumulates the statistics of the mean degree of the white and black graphs after its
+#move, the root holds the initial position
+class OpeningTree:
+
+    def __init__(self, maxDepth = 20, eloBandWidth = 200):
+        self.maxDepth = maxDepth
+        self.eloBandWidth = eloBandWidth
+        self.root = OpeningNode()
+
+    def getEloBand(self, game):
+        if(game.whiteElo is None or game.blackElo is None):
+            return -1
+        return min(game.whiteElo, game.blackElo)//self.eloBandWidth
+
+    #Replays the first maxDepth moves of a parsed game and adds it to every node on its path
+    def addGame(self, game, positionCache = None, boardBackend = ChessboardBackend.BITBOARD):
+        eloBand = self.getEloBand(game)
+        eco = game.headers.get("ECO")
+        board = Chessboard(boardBackend, verbose = False, positionCache = positionCache)
+        node = self.root
+        moveIndex = 0
+        for depth in range(0,min(self.maxDepth, len(game.sanMoves)) + 1):
+            if(depth > 0):
+                sanMove = game.sanMoves[depth - 1]
+                #Castlings and en passant captures were stored as two moves
+                plies = getPlyLength(game.moves, game.specialMoveValues, moveIndex)
+                for i in range(0,plies):
+                    board.makeMove(game.moves[moveIndex], game.specialMoveValues[moveIndex])
+                    moveIndex += 1
+                node = node.getChild(sanMove, True)
+            whiteDegree = positionConnectivity(board, ChessPieceColor.WHITE, positionCache)[1]
+            blackDegree = positionConnectivity(board, ChessPieceColor.BLACK, positionCache)[1]
+            node.addGame(eloBand, whiteDegree, blackDegree, game.winner, eco)
+
+    def addGames(self, games, positionCache = None):
+        for game in games:
+            self.addGame(game, positionCache)
+
+    #Adds the nodes and statistics of a tree built from other games
+    def merge(self, other):
+        if(other.eloBandWidth != self.eloBandWidth):
+            raise ValueError("Opening trees with different Elo bands cannot be merged")
+        self.maxDepth = max(self.maxDepth, other.maxDepth)
+        self.root.merge(other.root)
+
+    #sanMoves is a list of SAN moves or a movetext like "1.d4 d5 2.Nf3", with or without
+    #check and annotation marks
+    def getNode(self, sanMoves):
+        if(isinstance(sanMoves, str)):
+            sanMoves = [moveNumberPattern.sub("", token) for token in sanMoves.split()]
+            sanMoves = [sanMove for sanMove in sanMoves if sanMove != ""]
+        sanMoves = [sanSuffixPattern.sub("", sanMove) for sanMove in sanMoves]
+        node = self.root
+        for sanMove in sanMoves:
+            node = node.getChild(sanMove)
+            if(node is None):
+                return None
+        return node
+
+    #Statistics of the games that reached the moves, with the lower Elo of the two players
+    #between minElo and maxElo. The Elo limits are rounded to the bands of the tree
+    def getStatistics(self, sanMoves, minElo = None, maxElo = None):
+        statistics = RunningStatistics()
+        node = self.getNode(sanMoves)
+        if(node is None):
+            return statistics
+        for eloBand in node.bandStatistics:
+            if(minElo is not None and (eloBand < 0 or eloBand*self.eloBandWidth < minElo)):
+                continue
+            if(maxElo is not None and (eloBand < 0 or (eloBand + 1)*self.eloBandWidth - 1 > maxElo)):
+                continue
+            statistics.merge(node.bandStatistics[eloBand])
+        return statistics
+
+    def save(self, path):
+        with open(path, "w") as treeFile:
+            json.dump({"maxDepth": self.maxDepth, "eloBandWidth": self.eloBandWidth, "root": self.root.toDict()}, treeFile)
+
+    @classmethod
+    def load(cls, path):
+        with open(path, "r") as treeFile:
+            values = json.load(treeFile)
+        tree = cls(values["maxDepth"], values["eloBandWidth"])
+        tree.root = OpeningNode.fromDict(values["root"])
+        return tree
+
+
+#Builds the tree of a list of (headers, movetext) pairs, games that cannot be replayed are skipped
+def buildPartialTree(gameTexts, maxDepth = 20, eloBandWidth = 200):
+    tree = OpeningTree(maxDepth, eloBandWidth)
+    positionCache = PositionCache()
+    for headers, gameLines in gameTexts:
+        game = PGNGame(headers, gameLines)
+        try:
+            game.parseMoves(ChessboardBackend.BITBOARD)
+        except ValueError:
+            continue
+        tree.addGame(game, positionCache)
+    return tree
+
+def chunkGameTexts(gameTexts, chunkSize):
+    chunk = []
+    for gameText in gameTexts:
+        chunk.append(gameText)
+        if(len(chunk) == chunkSize):
+            yield chunk
+            chunk = []
+    if(len(chunk) > 0):
+        yield chunk
+
+#Streams the games of a PGN file into partial trees built by a pool of workers, chunkSize
+#games each, and merges every partial tree into the tree as soon as it comes back
+def buildOpeningTree(pgnPath, maxDepth = 20, eloBandWidth = 200, workers = None, chunkSize = 64):
+    tree = OpeningTree(maxDepth, eloBandWidth)
+    with open(pgnPath, "r") as pgnFile:
+        for partialTree in mapInPool(functools.partial(buildPartialTree, maxDepth = maxDepth, eloBandWidth = eloBandWidth), chunkGameTexts(iterateGameTexts(pgnFile), chunkSize), workers, 1):
+            tree.merge(partialTree)
+    return tree
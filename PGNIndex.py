@@ -0,0 +1,141 @@
+import io
+import os
+import re
+import mmap
+import numpy as np
+from ChessGame import ChessboardBackend
+from PGNReader import iterateGames
+from PGNReader import parseElo
+from PGNReader import parseWinner
+
+#A header block is a run of consecutive tag lines and the blank lines after it, every game
+#starts with one. Tag lines after a blank line start the next game, as in iterateGameTexts
+headerBlockPattern = re.compile(rb'(?m)(?:^\[[^\n]*\][ \t\r]*\n)+(?:[ \t\r]*\n)*')
+headerPattern = re.compile(rb'(?m)^\[(\w+)\s+"(.*)"\]')
+
+winnerCodes = {None: -1, "White": 0, "Black": 1}
+winnerNames = {-1: None, 0: "White", 1: "Black"}
+
+
+#Byte offset index of the games of a PGN file. The offset, length and the header values
+#PGNReader understands are stored for every game in a numpy structured array saved next to
+#the PGN file (game.pgn -> game.pgn.index.npy), so single games can be read and games can be
+#filtered by Elo, date or player without reading the whole file again
+class PGNIndex:
+
+    def __init__(self, pgnPath, indexPath = None, rebuild = False):
+        self.pgnPath = pgnPath
+        self.indexPath = indexPath if indexPath is not None else pgnPath + ".index.npy"
+
+        indexIsStale = not os.path.exists(self.indexPath) or os.path.getmtime(self.indexPath) < os.path.getmtime(pgnPath)
+        if(rebuild or indexIsStale):
+            self.games = buildIndex(pgnPath)
+            np.save(self.indexPath, self.games)
+        else:
+            self.games = np.load(self.indexPath, mmap_mode = "r")
+
+    def __len__(self):
+        return len(self.games)
+
+    def getGameText(self, gameNumber):
+        entry = self.games[gameNumber]
+        with open(self.pgnPath, "rb") as pgnFile:
+            pgnFile.seek(int(entry["offset"]))
+            return pgnFile.read(int(entry["length"])).decode("utf-8", errors = "replace")
+
+    def getGame(self, gameNumber, boardBackend = ChessboardBackend.NUMPY):
+        return next(iterateGames(io.StringIO(self.getGameText(gameNumber)), boardBackend))
+
+    def getHeaders(self, gameNumber):
+        entry = self.games[gameNumber]
+        return {"Date": entry["date"].decode("utf-8"),
+                "White": entry["white"].decode("utf-8"),
+                "Black": entry["black"].decode("utf-8"),
+                "WhiteElo": int(entry["whiteElo"]) if entry["whiteElo"] >= 0 else None,
+                "BlackElo": int(entry["blackElo"]) if entry["blackElo"] >= 0 else None,
+                "Winner": winnerNames[int(entry["winner"])]}
+
+    #Returns the numbers of the games that pass every given filter. minElo and maxElo apply
+    #to both players, dates are compared as PGN date strings (YYYY.MM.DD) and player matches
+    #either side
+    def filterGames(self, minElo = None, maxElo = None, dateFrom = None, dateTo = None, player = None, winner = None):
+        games = self.games
+        selected = np.ones(len(games), dtype = bool)
+        if(minElo is not None):
+            selected &= (games["whiteElo"] >= minElo) & (games["blackElo"] >= minElo)
+        if(maxElo is not None):
+            selected &= (games["whiteElo"] >= 0) & (games["whiteElo"] <= maxElo) & (games["blackElo"] >= 0) & (games["blackElo"] <= maxElo)
+        if(dateFrom is not None):
+            selected &= games["date"] >= dateFrom.encode("utf-8")
+        if(dateTo is not None):
+            selected &= games["date"] <= dateTo.encode("utf-8")
+        if(player is not None):
+            playerBytes = player.encode("utf-8")
+            selected &= (games["white"] == playerBytes) | (games["black"] == playerBytes)
+        if(winner is not None):
+            selected &= games["winner"] == winnerCodes[winner]
+        return np.nonzero(selected)[0]
+
+    #Parses the given games only, reading each one at its offset
+    def iterateGames(self, gameNumbers, boardBackend = ChessboardBackend.NUMPY, skipInvalidGames = False):
+        for gameNumber in gameNumbers:
+            try:
+                yield self.getGame(gameNumber, boardBackend)
+            except ValueError:
+                if(skipInvalidGames):
+                    continue
+                raise
+
+
+#Scans a PGN file once through a memory map and returns the structured array of the index
+def buildIndex(pgnPath):
+    offsets = []
+    headerValues = []
+    with open(pgnPath, "rb") as pgnFile:
+        if(os.fstat(pgnFile.fileno()).st_size == 0):
+            return emptyIndex()
+        with mmap.mmap(pgnFile.fileno(), 0, access = mmap.ACCESS_READ) as pgnMap:
+            for block in headerBlockPattern.finditer(pgnMap):
+                offsets.append(block.start())
+                headers = {}
+                for header in headerPattern.finditer(block.group(0)):
+                    headers[header.group(1).decode("utf-8", errors = "replace")] = header.group(2)
+                headerValues.append(headers)
+            fileSize = len(pgnMap)
+
+    if(len(offsets) == 0):
+        return emptyIndex()
+
+    lengths = np.diff(np.array(offsets + [fileSize], dtype = np.int64))
+    dates = [headers.get("Date", b"") for headers in headerValues]
+    whitePlayers = [headers.get("White", b"") for headers in headerValues]
+    blackPlayers = [headers.get("Black", b"") for headers in headerValues]
+    whiteElos = [parseElo(headers.get("WhiteElo", b"").decode("utf-8", errors = "replace")) for headers in headerValues]
+    blackElos = [parseElo(headers.get("BlackElo", b"").decode("utf-8", errors = "replace")) for headers in headerValues]
+    winners = []
+    for i in range(0,len(headerValues)):
+        termination = headerValues[i].get("Termination", b"").decode("utf-8", errors = "replace")
+        winner = parseWinner(termination, whitePlayers[i].decode("utf-8", errors = "replace"), blackPlayers[i].decode("utf-8", errors = "replace"))
+        winners.append(winnerCodes[winner])
+
+    games = np.zeros(len(offsets), dtype = indexDtype(dates, whitePlayers + blackPlayers))
+    games["offset"] = offsets
+    games["length"] = lengths
+    games["date"] = dates
+    games["white"] = whitePlayers
+    games["black"] = blackPlayers
+    games["whiteElo"] = [elo if elo is not None else -1 for elo in whiteElos]
+    games["blackElo"] = [elo if elo is not None else -1 for elo in blackElos]
+    games["winner"] = winners
+    return games
+
+#String fields are as wide as the longest value of the file, missing Elos are stored as -1
+def indexDtype(dates, players):
+    dateWidth = max([len(date) for date in dates] + [1])
+    playerWidth = max([len(player) for player in players] + [1])
+    return np.dtype([("offset", np.int64), ("length", np.int64), ("date", "S" + str(dateWidth)),
+                     ("white", "S" + str(playerWidth)), ("black", "S" + str(playerWidth)),
+                     ("whiteElo", np.int32), ("blackElo", np.int32), ("winner", np.int8)])
+
+def emptyIndex():
+    return np.zeros(0, dtype = indexDtype([], []))
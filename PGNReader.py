@@ -1,15 +1,132 @@
+import re
 from ChessGame import Chessboard
 from ChessGame import ChessMove
 from ChessGame import ChessPieceColor
 from ChessGraph import Chessgraph
 from ChessGame import ChessPieceType
+from ChessGame import ChessboardBackend
+from ChessGame import packMoveList
+
+#King and rook moves of each castling, by color and castling string
+castlingMoves = {(ChessPieceColor.WHITE, "O-O"): ((["E", 1], ["G", 1]), (["H", 1], ["F", 1])),
+                 (ChessPieceColor.BLACK, "O-O"): ((["E", 8], ["G", 8]), (["H", 8], ["F", 8])),
+                 (ChessPieceColor.WHITE, "O-O-O"): ((["E", 1], ["C", 1]), (["A", 1], ["D", 1])),
+                 (ChessPieceColor.BLACK, "O-O-O"): ((["E", 8], ["C", 8]), (["A", 8], ["D", 8]))}
+
+#One alternative per token of the PGN export format, movetext is scanned once with finditer.
+#Comments, NAGs and results are recognised so they never read as moves
+movetextPattern = re.compile(r"""
+    (?P<comment>\{[^}]*\}|;[^\n]*)
+   |(?P<variationStart>\()
+   |(?P<variationEnd>\))
+   |(?P<nag>\$\d+)
+   |(?P<result>1-0|0-1|1/2-1/2|\*)
+   |(?P<moveNumber>\d+\.+)
+   |(?P<castling>O-O-O|O-O|0-0-0|0-0)[+#]?[!?]*
+   |(?P<san>(?P<piece>[NBRQK])?(?P<fromFile>[a-h])?(?P<fromRank>[1-8])?(?P<take>x)?(?P<toFile>[a-h])(?P<toRank>[1-8])(?:=?(?P<promotion>[NBRQ]))?)[+#]?[!?]*
+   |(?P<unknown>\S+)
+""", re.VERBOSE)
+
+sanPieceTypes = {"N": ChessPieceType.KNIGHT, "B": ChessPieceType.BISHOP, "R": ChessPieceType.ROOK,
+                 "Q": ChessPieceType.QUEEN, "K": ChessPieceType.KING, None: ChessPieceType.PAWN}
+
+#Replays the movetext of a game on board and returns the ChessMove list, the special
+#move flags (castlings and en passant captures are two special moves, king captures one, see
+#ChessGame.getPlyLength) and the SAN string of every move, without check and annotation marks. Moves inside variations are skipped and the
+#result ends the game. Unknown tokens and moves no piece can play raise a ValueError, so
+#the moves returned are always the ones played on board
+def parseMovetext(gameLines, board):
+    moves = []
+    specialMoveValues = []
+    sanMoves = []
+    
+    moveCounter = 0
+    variationDepth = 0
+    for token in movetextPattern.finditer(gameLines):
+        kind = token.lastgroup
+        if(kind == "variationStart"):
+            variationDepth += 1
+            continue
+        elif(kind == "variationEnd"):
+            variationDepth -= 1
+            continue
+        elif(kind == "unknown"):
+            raise ValueError("Unknown movetext token " + token.group(0))
+        elif(variationDepth > 0 or kind == "comment" or kind == "nag" or kind == "moveNumber"):
+            continue
+        elif(kind == "result"):
+            break
+        
+        if(moveCounter %2 == 0):
+            pieceColor = ChessPieceColor.WHITE
+        else:
+            pieceColor = ChessPieceColor.BLACK
+        
+        if(token.group("castling") is not None):
+            castling = token.group("castling").replace("0", "O")
+            kingMove, rookMove = castlingMoves[(pieceColor, castling)]
+            move1 = ChessMove(list(kingMove[0]), list(kingMove[1]), False)
+            move2 = ChessMove(list(rookMove[0]), list(rookMove[1]), False)
+            moves.append(move1)
+            moves.append(move2)
+            specialMoveValues.append(True)
+            specialMoveValues.append(True)
+            sanMoves.append(castling)
+            if(not board.makeMove(move1, True) or not board.makeMove(move2, True)):
+                raise ValueError("Cannot play " + token.group(0))
+            moveCounter += 1
+            continue
+        
+        pieceType = sanPieceTypes[token.group("piece")]
+        file = token.group("toFile").upper()
+        rank = int(token.group("toRank"))
+        fromFile = token.group("fromFile").upper() if token.group("fromFile") is not None else -1
+        fromRank = int(token.group("fromRank")) if token.group("fromRank") is not None else -1
+        promotion = sanPieceTypes[token.group("promotion")] if token.group("promotion") is not None else None
+        
+        if(pieceType == ChessPieceType.PAWN and token.group("take") is not None and board.enPassantSquare == [file, rank]):
+            #The pawn takes the pawn beside it and then steps forward, both as special moves
+            #so the second one does not count as a move of its own in the FEN state
+            fromRank = rank - 1 if pieceColor == ChessPieceColor.WHITE else rank + 1
+            piece = board.findPieceAtPosition(fromFile, fromRank)
+            if(piece == -1 or piece.pieceType != ChessPieceType.PAWN or piece.pieceColor != pieceColor):
+                raise ValueError("No piece can play " + token.group("san"))
+            move1 = ChessMove([fromFile, fromRank], [file, fromRank], True)
+            move2 = ChessMove([file, fromRank], [file, rank], False)
+            moves.append(move1)
+            moves.append(move2)
+            specialMoveValues.append(True)
+            specialMoveValues.append(True)
+            sanMoves.append(token.group("san"))
+            if(not board.makeMove(move1, True) or not board.makeMove(move2, True)):
+                raise ValueError("Cannot play " + token.group("san"))
+            moveCounter += 1
+            continue
+        
+        piece = board.findPieceOfTypeThatCanGoToPosition(pieceType, file, rank, pieceColor, fromFile, fromRank)
+        if(piece is None):
+            raise ValueError("No piece can play " + token.group("san"))
+        take = token.group("take") is not None
+        move = ChessMove([piece.file, piece.rank],[file, rank], take, promotion)
+        #King moves are never generated as takes, a king capture is played as a special move
+        #so the captured piece leaves the board (as in Benchmarks.perft)
+        specialMove = take and pieceType == ChessPieceType.KING
+        if(not board.makeMove(move, specialMove)):
+            raise ValueError("Cannot play " + token.group("san"))
+        moves.append(move)
+        specialMoveValues.append(specialMove)
+        sanMoves.append(token.group("san"))
+        moveCounter += 1
+    
+    return moves, specialMoveValues, sanMoves
 
 class PGNReader:
     
-    def __init__(self, chessGameURL):
+    def __init__(self, chessGameURL, boardBackend = ChessboardBackend.NUMPY):
+        self.boardBackend = boardBackend
         pgnFile = open(chessGameURL, "r")
         fileLines = pgnFile.readlines()
-        gameLines = ""
+        gameLines = []
         gameLineReached = False
         for i in range(0,len(fileLines)):
             #Recopilamos la fecha del juego
@@ -33,15 +150,13 @@ class PGNReader:
             if("BlackElo" in fileLines[i]):
                 self.blackElo = int(fileLines[i].split("\"")[1])
             
-            if(gameLineReached and i != len(fileLines)):
-                gameLines = gameLines + fileLines[i] + " "
-            elif(gameLineReached):
-                gameLines = gameLines + fileLines[i]
+            if(gameLineReached):
+                gameLines.append(fileLines[i] + " ")
             
             if(fileLines[i] == "\n"):
                 gameLineReached = True
             
-        self.gameLines = gameLines
+        self.gameLines = "".join(gameLines)
         
         pgnFile.close()
         self.printGameInfo()
@@ -52,140 +167,10 @@ class PGNReader:
     
     
     def parseMoves(self):
-        self.moves = []
-        self.specialMoveValues = []
-        board = Chessboard()
-        
-        stringMoves = self.gameLines.split(" ")
-        moveCounter = 0
-        for i in range(0,len(stringMoves)):
-            #print(stringMoves[i])
-            if(not "." in stringMoves[i] and not "-" in stringMoves[i] and stringMoves[i] != "" and stringMoves[i] != "\n"):
-        
-                moveString = stringMoves[i]
-                moveString = moveString.replace('+','')
-                moveString = moveString.replace('#','')
-                moveString = moveString.replace('\n', '')
-                moveString = moveString.replace('\r','')
-                pieceType = self.parsePieceType(moveString)
-                takeValue = self.parseTakeValue(moveString)
-                fromFile = self.parseFromFile(moveString)
-                
-                moveSegment = moveString[-2:]
-                file = moveSegment[0].upper()
-                rank = int(moveSegment[1])
-                pieceColor = -1
-                if(moveCounter %2 == 0):
-                    pieceColor = ChessPieceColor.WHITE
-                else:
-                    pieceColor = ChessPieceColor.BLACK
-                piece = board.findPieceOfTypeThatCanGoToPosition(pieceType, file, rank, pieceColor, fromFile)
-                move = ChessMove([piece.file, piece.rank],[file, rank], takeValue)
-                self.moves.append(move)
-                board.makeMove(move, False)
-                moveCounter += 1
-                self.specialMoveValues.append(False)
-                
-            elif(not "." in stringMoves[i] and stringMoves[i] == "O-O"):
-                #White is castling short
-                if(moveCounter %2 == 0):
-                    move1 = ChessMove(["E", 1],["G", 1], False)
-                    move2 = ChessMove(["H",1],["F",1],False)
-                    self.specialMoveValues.append(True)
-                    self.specialMoveValues.append(True)
-                    self.moves.append(move1)
-                    self.moves.append(move2)
-                    board.makeMove(move1, True)
-                    board.makeMove(move2, True)
-                    moveCounter += 1
-                
-                elif(moveCounter %2 == 1):
-                    move1 = ChessMove(["E", 8],["G",8], False)
-                    move2 = ChessMove(["H",8],["F",8], False)
-                    self.specialMoveValues.append(True)
-                    self.specialMoveValues.append(True)
-                    self.moves.append(move1)
-                    self.moves.append(move2)
-                    board.makeMove(move1,True)
-                    board.makeMove(move2, True)
-                    moveCounter += 1
-            
-            elif(not "." in stringMoves[i] and stringMoves[i] == "O-O-O"):
-                
-                if(moveCounter %2 == 0):
-                    move1 = ChessMove(["E", 1],["C", 1], False)
-                    move2 = ChessMove(["A",1],["D",1],False)
-                    self.specialMoveValues.append(True)
-                    self.specialMoveValues.append(True)
-                    self.moves.append(move1)
-                    self.moves.append(move2)
-                    board.makeMove(move1, True)
-                    board.makeMove(move2, True)
-                    moveCounter += 1
-                
-                elif(moveCounter %2 == 1):
-                    move1 = ChessMove(["E", 8],["C",8], False)
-                    move2 = ChessMove(["A",8],["D",8], False)
-                    self.specialMoveValues.append(True)
-                    self.specialMoveValues.append(True)
-                    self.moves.append(move1)
-                    self.moves.append(move2)
-                    board.makeMove(move1,True)
-                    board.makeMove(move2, True)
-                    moveCounter += 1  
+        board = Chessboard(self.boardBackend)
+        self.moves, self.specialMoveValues, self.sanMoves = parseMovetext(self.gameLines, board)
         board.displayBoard()
                     
-    #I don't know how to do this efficiently so i'll do it
-    #in the stupidest way
-    def parseFromFile(self, moveString):
-        residual = moveString[:-2]
-        if("a" in residual):
-            return "A"
-        elif("b" in residual):
-            return "B"
-        elif("c" in residual):
-            return "C"
-        elif("d" in residual):
-            return "D"
-        elif("e" in residual):
-            return "E"
-        elif("f") in residual:
-            return "F"
-        elif("g" in residual):
-            return "G"
-        elif("h" in residual):
-            return "H"
-        else:
-            return -1
-    
-    def parsePieceType(self, moveString):
-        if(moveString[0] == "N"):
-            return ChessPieceType.KNIGHT
-        elif(moveString[0] == "B"):
-            return ChessPieceType.BISHOP
-        elif(moveString[0] == "R"):
-            return ChessPieceType.ROOK
-        elif(moveString[0] == "Q"):
-            return ChessPieceType.QUEEN
-        elif(moveString[0] == "K"):
-            return ChessPieceType.KING
-        else:
-            return ChessPieceType.PAWN
-    
-    def parseTakeValue(self, moveString):
-        if("x" in moveString):
-            return True
-        else:
-            return False
-                    
-                    
-                    
-                
-                
-            
-        
-        
-    
     def printGameInfo(self):
         s = ""
         s = s + "Date: "+self.date+"\n"
@@ -195,4 +180,90 @@ class PGNReader:
         s = s + "White Elo: "+str(self.whiteElo) + "\n"
         s = s + "Black Elo: "+str(self.blackElo) + "\n"
         s = s + "Game: " +self.gameLines
-        print(s)
\ No newline at end of file
+        print(s)
+
+
+headerPattern = re.compile(r'^\[(\w+)\s+"(.*)"\]\s*$')
+
+#One game of a PGN file, the header values PGNReader understands are also kept as attributes
+class PGNGame:
+    
+    def __init__(self, headers, gameLines):
+        self.headers = headers
+        self.gameLines = gameLines
+        self.date = headers.get("Date")
+        self.whitePlayer = headers.get("White")
+        self.blackPlayer = headers.get("Black")
+        self.whiteElo = parseElo(headers.get("WhiteElo"))
+        self.blackElo = parseElo(headers.get("BlackElo"))
+        self.winner = parseWinner(headers.get("Termination", ""), self.whitePlayer, self.blackPlayer)
+        self.moves = []
+        self.specialMoveValues = []
+        self.sanMoves = []
+    
+    def parseMoves(self, boardBackend = ChessboardBackend.NUMPY):
+        board = Chessboard(boardBackend, verbose = False)
+        self.moves, self.specialMoveValues, self.sanMoves = parseMovetext(self.gameLines, board)
+    
+    #The moves and special move flags packed in a uint16 array, see ChessGame.packMove
+    def getPackedMoves(self):
+        return packMoveList(self.moves, self.specialMoveValues)
+
+def parseElo(eloString):
+    if(eloString is None or not eloString.isdigit()):
+        return None
+    return int(eloString)
+
+#Same rule as PGNReader: the winner is the player named in the termination
+def parseWinner(termination, whitePlayer, blackPlayer):
+    if(whitePlayer and whitePlayer in termination):
+        return "White"
+    elif(blackPlayer and blackPlayer in termination):
+        return "Black"
+    return None
+
+#Reads a PGN file line by line and yields the headers dictionary and the movetext of
+#every game (lines kept, ; comments end at the line end), only the lines of the current
+#game are kept in memory. A header line after the movetext, or after a blank line that
+#ended the headers, starts a new game, so a game without movetext is yielded on its own
+def iterateGameTexts(pgnFile):
+    headers = {}
+    movetextLines = []
+    headersEnded = False
+    for line in pgnFile:
+        line = line.strip()
+        if(line.startswith("[")):
+            if(len(movetextLines) > 0 or headersEnded):
+                yield headers, "\n".join(movetextLines)
+                headers = {}
+                movetextLines = []
+                headersEnded = False
+            match = headerPattern.match(line)
+            if(match):
+                headers[match.group(1)] = match.group(2)
+        elif(line != ""):
+            movetextLines.append(line)
+        elif(len(headers) > 0):
+            headersEnded = True
+    
+    if(len(movetextLines) > 0 or len(headers) > 0):
+        yield headers, "\n".join(movetextLines)
+
+#Yields the games of a PGN file (a path or an open file) one at a time, with their moves
+#already parsed. Nothing is printed or drawn. Games whose moves cannot be replayed raise
+#a ValueError unless skipInvalidGames is True, in which case they are left out
+def iterateGames(source, boardBackend = ChessboardBackend.NUMPY, skipInvalidGames = False):
+    if(isinstance(source, str)):
+        with open(source, "r") as pgnFile:
+            yield from iterateGames(pgnFile, boardBackend, skipInvalidGames)
+        return
+    
+    for headers, gameLines in iterateGameTexts(source):
+        game = PGNGame(headers, gameLines)
+        try:
+            game.parseMoves(boardBackend)
+        except ValueError:
+            if(skipInvalidGames):
+                continue
+            raise
+        yield game
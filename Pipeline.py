@@ -0,0 +1,296 @@
+import time
+import queue
+import threading
+from ChessGame import ChessPieceColor
+from ChessGame import ChessboardBackend
+from PGNReader import PGNGame
+from PGNReader import iterateGameTexts
+from GameConnectivity import GameConnectivity
+
+#Marks the end of the items in a queue
+endOfStream = object()
+
+
+#A step of a Pipeline. function takes an item and returns the item for the next stage, or
+#None to drop it. With generator = True function takes the iterator of the input items and
+#yields the output items instead, so a stage can split, merge or buffer them
+class PipelineStage:
+
+    def __init__(self, name, function, generator = False):
+        self.name = name
+        self.function = function
+        self.generator = generator
+        self.resetStatistics()
+
+    def resetStatistics(self):
+        self.itemsIn = 0
+        self.itemsOut = 0
+        #Time spent running function, waiting for input items and waiting for space in the
+        #output queue (downstream is slower)
+        self.busySeconds = 0.0
+        self.starvedSeconds = 0.0
+        self.blockedSeconds = 0.0
+        #Depth of the output queue after every put
+        self.queueDepthTotal = 0
+        self.maxQueueDepth = 0
+
+    def mapItems(self, items):
+        for item in items:
+            result = self.function(item)
+            if(result is not None):
+                yield result
+
+    #Output items of the stage, input is None for the first stage
+    def iterateOutput(self, items):
+        if(self.generator):
+            return self.function(items) if items is not None else self.function()
+        return self.mapItems(items)
+
+    #Items the stage handled: the input items, or the output items of the first stage
+    def getProcessedItems(self):
+        return self.itemsIn if self.itemsIn > 0 else self.itemsOut
+
+    def getStatistics(self):
+        return {"itemsIn": self.itemsIn, "itemsOut": self.itemsOut, "busySeconds": self.busySeconds,
+                "starvedSeconds": self.starvedSeconds, "blockedSeconds": self.blockedSeconds,
+                "itemsPerSecond": self.getProcessedItems()/self.busySeconds if self.busySeconds > 0 else 0.0,
+                "meanQueueDepth": self.queueDepthTotal/self.itemsOut if self.itemsOut > 0 else 0.0,
+                "maxQueueDepth": self.maxQueueDepth}
+
+
+#Queue operations in steps, so every stage stops when another one fails. A stopped get
+#gives endOfStream and a stopped put returns False
+def getItem(itemQueue, stopEvent):
+    while(not stopEvent.is_set()):
+        try:
+            return itemQueue.get(timeout = 0.1)
+        except queue.Empty:
+            continue
+    return endOfStream
+
+def putItem(itemQueue, item, stopEvent):
+    while(not stopEvent.is_set()):
+        try:
+            itemQueue.put(item, timeout = 0.1)
+            return True
+        except queue.Full:
+            continue
+    return False
+
+
+#Input items of a stage read from the queue of the previous one, counting the items and the
+#time spent waiting for them
+class StageInput:
+
+    def __init__(self, stage, inputQueue, stopEvent):
+        self.stage = stage
+        self.inputQueue = inputQueue
+        self.stopEvent = stopEvent
+        self.waitSeconds = 0.0
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        start = time.perf_counter()
+        item = getItem(self.inputQueue, self.stopEvent)
+        self.waitSeconds += time.perf_counter() - start
+        if(item is endOfStream):
+            raise StopIteration
+        self.stage.itemsIn += 1
+        return item
+
+
+#Same for the stage before it when the stages run one after the other, without queues
+class ChainedInput:
+
+    def __init__(self, stage, items):
+        self.stage = stage
+        self.items = items
+        self.waitSeconds = 0.0
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        start = time.perf_counter()
+        item = next(self.items)
+        self.waitSeconds += time.perf_counter() - start
+        self.stage.itemsIn += 1
+        return item
+
+
+#Chain of stages, the first one yields the items (it is a generator stage without input) and
+#the last one is the sink. With threaded = True every stage runs in its own thread and the
+#stages are joined by queues of queueSize items, so a stage waiting on a file or on numpy
+#lets the others run and at most queueSize items wait between two stages. Python code of
+#different stages does not run at the same time, so busy times of threaded stages include
+#waiting for the interpreter. With threaded = False the stages are chained generators in the
+#calling thread
+class Pipeline:
+
+    def __init__(self, stages = None, queueSize = 64, threaded = True):
+        self.stages = []
+        self.queueSize = queueSize
+        self.threaded = threaded
+        self.wallSeconds = 0.0
+        for stage in (stages if stages is not None else []):
+            self.addStage(stage)
+
+    def addStage(self, stage, function = None, generator = False):
+        if(not isinstance(stage, PipelineStage)):
+            stage = PipelineStage(stage, function, generator)
+        self.stages.append(stage)
+        return self
+
+    def run(self):
+        for stage in self.stages:
+            stage.resetStatistics()
+        start = time.perf_counter()
+        if(self.threaded):
+            self.runThreaded()
+        else:
+            self.runChained()
+        self.wallSeconds = time.perf_counter() - start
+        return self.getStatistics()
+
+    def runChained(self):
+        items = None
+        for stage in self.stages:
+            stageInput = ChainedInput(stage, items) if items is not None else None
+            items = self.iterateStage(stage, stageInput)
+        for item in items:
+            pass
+
+    #Output items of a stage, the time of every next() is split between running the stage and
+    #waiting for its input. Time spent by the consumer of the items is not counted. Closing
+    #it closes the output of the stage too, e.g. the file of a read stage
+    def iterateStage(self, stage, stageInput):
+        output = stage.iterateOutput(stageInput)
+        try:
+            while(True):
+                start = time.perf_counter()
+                waitBefore = stageInput.waitSeconds if stageInput is not None else 0.0
+                try:
+                    item = next(output)
+                except StopIteration:
+                    item = endOfStream
+                waited = (stageInput.waitSeconds if stageInput is not None else 0.0) - waitBefore
+                stage.busySeconds += time.perf_counter() - start - waited
+                stage.starvedSeconds += waited
+                if(item is endOfStream):
+                    return
+                stage.itemsOut += 1
+                yield item
+        finally:
+            if(hasattr(output, "close")):
+                output.close()
+
+    def runThreaded(self):
+        queues = [queue.Queue(self.queueSize) for i in range(0,len(self.stages) - 1)]
+        stopEvent = threading.Event()
+        errors = []
+
+        def runStage(stageIndex):
+            stage = self.stages[stageIndex]
+            stageInput = StageInput(stage, queues[stageIndex - 1], stopEvent) if stageIndex > 0 else None
+            outputQueue = queues[stageIndex] if stageIndex < len(queues) else None
+
+            stageOutput = self.iterateStage(stage, stageInput)
+            try:
+                for item in stageOutput:
+                    if(outputQueue is None):
+                        continue
+                    start = time.perf_counter()
+                    stored = putItem(outputQueue, item, stopEvent)
+                    stage.blockedSeconds += time.perf_counter() - start
+                    #Another stage failed, the stages with an input stop when it is stopped
+                    #but the first one only notices here
+                    if(not stored):
+                        break
+                    depth = outputQueue.qsize()
+                    stage.queueDepthTotal += depth
+                    stage.maxQueueDepth = max(stage.maxQueueDepth, depth)
+            except BaseException as error:
+                errors.append(error)
+                stopEvent.set()
+            finally:
+                stageOutput.close()
+                if(outputQueue is not None):
+                    putItem(outputQueue, endOfStream, stopEvent)
+
+        threads = [threading.Thread(target = runStage, args = (i,), name = "Pipeline " + self.stages[i].name, daemon = True) for i in range(0,len(self.stages))]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        if(len(errors) > 0):
+            raise errors[0]
+
+    def getStatistics(self):
+        return {"wallSeconds": self.wallSeconds, "stages": {stage.name: stage.getStatistics() for stage in self.stages}}
+
+    def printStatistics(self):
+        print("Stage".ljust(16) + "In".rjust(10) + "Out".rjust(10) + "Items/s".rjust(12) + "Busy (s)".rjust(11) + "Starved (s)".rjust(13) + "Blocked (s)".rjust(13) + "Queue".rjust(8) + "Max".rjust(6))
+        for stage in self.stages:
+            values = stage.getStatistics()
+            print(stage.name.ljust(16) + str(values["itemsIn"]).rjust(10) + str(values["itemsOut"]).rjust(10) + ("%.1f" % values["itemsPerSecond"]).rjust(12)
+                  + ("%.3f" % values["busySeconds"]).rjust(11) + ("%.3f" % values["starvedSeconds"]).rjust(13) + ("%.3f" % values["blockedSeconds"]).rjust(13)
+                  + ("%.1f" % values["meanQueueDepth"]).rjust(8) + str(values["maxQueueDepth"]).rjust(6))
+        print("Wall time " + ("%.3f" % self.wallSeconds) + " s")
+
+
+#Stages of the PGN to metrics pipeline, items are (game number in the file, value) pairs
+
+#(game number, (headers, movetext)) of every game of the file
+def readGameTexts(pgnPath):
+    def read():
+        with open(pgnPath, "r") as pgnFile:
+            for gameNumber, gameText in enumerate(iterateGameTexts(pgnFile)):
+                yield gameNumber, gameText
+    return read
+
+#Games that cannot be replayed are dropped
+def parseGameText(boardBackend = ChessboardBackend.BITBOARD):
+    def parse(item):
+        gameNumber, (headers, gameLines) = item
+        game = PGNGame(headers, gameLines)
+        try:
+            game.parseMoves(boardBackend)
+        except ValueError:
+            return None
+        return gameNumber, game
+    return parse
+
+#Replays the game once, the graphs of every ply are kept as adjacency tensors
+def replayGame(boardBackend = ChessboardBackend.BITBOARD):
+    def replay(item):
+        gameNumber, game = item
+        return gameNumber, GameConnectivity(game.moves, game.specialMoveValues, False, boardBackend)
+    return replay
+
+#Metrics of the MetricsStore columns, the same values as MetricsStore.computeGameMetrics
+def computeConnectivityMetrics(item):
+    gameNumber, connectivity = item
+    metrics = {}
+    for color in ChessPieceColor:
+        name = color.name.lower()
+        metrics[name + "MeanDegree"] = connectivity.getMeanDegrees(color)
+        metrics[name + "DegreeDistribution"] = connectivity.getDegreeDistributions(color)
+    return gameNumber, metrics
+
+#Appends the metrics to a MetricsStore under the game number
+def writeToStore(store):
+    def write(item):
+        gameNumber, metrics = item
+        store.appendGame(metrics, gameNumber)
+    return write
+
+#read, parse, replay, metrics and sink stages from a PGN file to a MetricsStore. The store
+#is not closed, call store.flush() or store.close() after run()
+def buildMetricsPipeline(pgnPath, store, queueSize = 64, threaded = True, boardBackend = ChessboardBackend.BITBOARD):
+    return Pipeline([PipelineStage("read", readGameTexts(pgnPath), True),
+                     PipelineStage("parse", parseGameText(boardBackend)),
+                     PipelineStage("replay", replayGame(boardBackend)),
+                     PipelineStage("metrics", computeConnectivityMetrics),
+                     PipelineStage("sink", writeToStore(store))], queueSize, threaded)
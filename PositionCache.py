@@ -0,0 +1,71 @@
+from collections import OrderedDict
+from ChessGame import ChessPieceColor
+from ChessGraph import Chessgraph
+
+
+#Bounded least recently used cache of per position results. Entries are keyed by
+#Chessboard.positionKey() (Zobrist hash and side to move) and hold named fields: "moves"
+#is filled by Chessboard.makeMove and the degree distribution and mean degree of each
+#color by positionConnectivity. The same cache can be shared by every board of a corpus
+class PositionCache:
+
+    def __init__(self, capacity = 100000):
+        self.capacity = capacity
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self.entries)
+
+    #Returns the field of the position or None, counting a hit or a miss
+    def get(self, key, field):
+        entry = self.entries.get(key)
+        if(entry is None or field not in entry):
+            self.misses += 1
+            return None
+        self.entries.move_to_end(key)
+        self.hits += 1
+        return entry[field]
+
+    def put(self, key, field, value):
+        entry = self.entries.get(key)
+        if(entry is None):
+            entry = {}
+            self.entries[key] = entry
+            while(len(self.entries) > self.capacity):
+                self.entries.popitem(last = False)
+        else:
+            self.entries.move_to_end(key)
+        entry[field] = value
+
+    def clear(self):
+        self.entries.clear()
+        self.hits = 0
+        self.misses = 0
+
+    def getHitRate(self):
+        lookups = self.hits + self.misses
+        return self.hits/lookups if lookups > 0 else 0
+
+    def getStatistics(self):
+        return {"capacity": self.capacity, "entries": len(self.entries), "hits": self.hits, "misses": self.misses, "hitRate": self.getHitRate()}
+
+
+#Degree distribution and mean degree of the graph of the pieces of one color, as
+#Chessgraph.initializeFromChessboardColored would give them. With a cache the graph is
+#only built the first time the position is seen. The distribution is shared with the
+#cache and must not be modified
+def positionConnectivity(chessboard, piecesColor, positionCache = None):
+    field = "whiteConnectivity" if piecesColor == ChessPieceColor.WHITE else "blackConnectivity"
+    if(positionCache is not None):
+        connectivity = positionCache.get(chessboard.positionKey(), field)
+        if(connectivity is not None):
+            return connectivity
+
+    graph = Chessgraph()
+    graph.initializeFromChessboardColored(chessboard, piecesColor)
+    connectivity = (graph.getDegreeDistribution()[1], graph.getMeanDegree())
+    if(positionCache is not None):
+        positionCache.put(chessboard.positionKey(), field, connectivity)
+    return connectivity